@@ -0,0 +1,47 @@
+# activity_log.py
+import datetime
+import os
+import threading
+
+from config import SENDING_LOG_PATH
+
+
+class ActivityLog:
+    """
+    Thread-safe activity log: any thread adds lines, the UI takes them in batches.
+
+    write() only queues the timestamped line, so worker threads can log freely without
+    touching widgets or files. drain() hands over everything queued since the last call and
+    appends it to the log file in one write (the file is opened once, buffered).
+    """
+    def __init__(self, path=SENDING_LOG_PATH):
+        self.path = path
+        self._pending = []
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write(self, message, message_type="info"):
+        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        with self._lock:
+            self._pending.append((f"[{timestamp}] {message}", message_type))
+
+    def drain(self):
+        """Returns the queued [(line, message_type)] in order, after writing them to the file."""
+        with self._lock:
+            if not self._pending:
+                return []
+            entries, self._pending = self._pending, []
+        if self.path:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8", buffering=64 * 1024)
+            self._file.write("".join(line + "\n" for line, _ in entries))
+            self._file.flush() # One system call per batch, and little is lost on a crash
+        return entries
+
+    def close(self):
+        """Writes out anything still queued and closes the file."""
+        self.drain()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
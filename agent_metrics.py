@@ -0,0 +1,176 @@
+# agent_metrics.py
+import collections
+import json
+import math
+import threading
+import time
+
+from config import AI_METRICS_JSONL_PATH
+
+
+def make_record(operation, model, wall_time, time_to_first_token=None, prompt_tokens=0,
+                completion_tokens=0, cache_status=None, error=None):
+    """Builds one metrics record (a plain dict, so every sink can serialize it)."""
+    return {
+        "timestamp": time.time(),
+        "operation": operation,
+        "model": model,
+        "wall_time": wall_time,
+        "time_to_first_token": time_to_first_token,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cache_status": cache_status,
+        "error": error,
+    }
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q between 0 and 100) of a list of numbers, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(records, percentiles=(50, 90, 99)):
+    """
+    Summarizes metrics records per (operation, model).
+
+    Returns:
+        dict: {"operation/model": {"calls", "errors", "cache_hits", "prompt_tokens",
+               "completion_tokens", "wall_time": {"p50": ...}, "time_to_first_token": {...}}}
+    """
+    groups = collections.defaultdict(list)
+    for record in records:
+        groups[f"{record['operation']}/{record['model']}"].append(record)
+
+    summary = {}
+    for name, items in groups.items():
+        wall_times = [r["wall_time"] for r in items]
+        first_tokens = [r["time_to_first_token"] for r in items if r["time_to_first_token"] is not None]
+        summary[name] = {
+            "calls": len(items),
+            "errors": sum(1 for r in items if r["error"]),
+            "cache_hits": sum(1 for r in items if r["cache_status"] == "hit"),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in items),
+            "completion_tokens": sum(r["completion_tokens"] for r in items),
+            "wall_time": {f"p{q}": percentile(wall_times, q) for q in percentiles},
+            "time_to_first_token": {f"p{q}": percentile(first_tokens, q) for q in percentiles},
+        }
+    return summary
+
+
+class InMemoryMetricsSink:
+    """Keeps the most recent records in memory (bounded), for summaries in the UI."""
+    def __init__(self, max_records=10000):
+        self._records = collections.deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def summary(self):
+        return summarize(self.records())
+
+
+class JSONLMetricsSink:
+    """Appends every record as one JSON line to a file, for offline analysis."""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class PrometheusTextSink:
+    """
+    Aggregates records into counters and latency quantiles and renders them in the
+    Prometheus text exposition format (render()), e.g. for a /metrics endpoint.
+    """
+    def __init__(self, max_samples=2000, quantiles=(0.5, 0.9, 0.99)):
+        self.quantiles = quantiles
+        self._calls = collections.Counter()     # (operation, model, cache_status, error) -> count
+        self._tokens = collections.Counter()    # (model, kind) -> tokens
+        self._wall = collections.defaultdict(lambda: collections.deque(maxlen=max_samples))
+        self._first_token = collections.defaultdict(lambda: collections.deque(maxlen=max_samples))
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        with self._lock:
+            key = (record["operation"], record["model"], record["cache_status"] or "none", record["error"] or "none")
+            self._calls[key] += 1
+            self._tokens[(record["model"], "prompt")] += record["prompt_tokens"]
+            self._tokens[(record["model"], "completion")] += record["completion_tokens"]
+            self._wall[(record["operation"], record["model"])].append(record["wall_time"])
+            if record["time_to_first_token"] is not None:
+                self._first_token[(record["operation"], record["model"])].append(record["time_to_first_token"])
+
+    def _summary_lines(self, name, samples):
+        lines = [f"# TYPE {name} summary"]
+        for (operation, model), values in sorted(samples.items()):
+            labels = f'operation="{operation}",model="{model}"'
+            for q in self.quantiles:
+                lines.append(f'{name}{{{labels},quantile="{q}"}} {percentile(list(values), q * 100)}')
+            lines.append(f"{name}_sum{{{labels}}} {sum(values)}")
+            lines.append(f"{name}_count{{{labels}}} {len(values)}")
+        return lines
+
+    def render(self):
+        with self._lock:
+            lines = ["# TYPE email_agent_calls_total counter"]
+            for (operation, model, cache_status, error), count in sorted(self._calls.items()):
+                lines.append(
+                    f'email_agent_calls_total{{operation="{operation}",model="{model}",'
+                    f'cache_status="{cache_status}",error="{error}"}} {count}'
+                )
+            lines.append("# TYPE email_agent_tokens_total counter")
+            for (model, kind), count in sorted(self._tokens.items()):
+                lines.append(f'email_agent_tokens_total{{model="{model}",kind="{kind}"}} {count}')
+            lines += self._summary_lines("email_agent_wall_seconds", self._wall)
+            lines += self._summary_lines("email_agent_first_token_seconds", self._first_token)
+        return "\n".join(lines) + "\n"
+
+
+class FanOutMetricsSink:
+    """Sends every record to several sinks; a failing sink never breaks an agent call."""
+    def __init__(self, *sinks):
+        self.sinks = list(sinks)
+
+    def record(self, record):
+        for sink in self.sinks:
+            try:
+                sink.record(record)
+            except Exception as e:
+                print(f"Metrics sink {type(sink).__name__} failed: {e}")
+
+
+_default_memory_sink = InMemoryMetricsSink()
+_default_sink = None
+_default_sink_lock = threading.Lock()
+
+
+def get_memory_sink():
+    """Returns the process-wide in-memory sink (always part of the default sink)."""
+    return _default_memory_sink
+
+
+def get_default_metrics_sink():
+    """Returns the process-wide sink: in memory, plus a JSONL file if AI_METRICS_JSONL_PATH is set."""
+    global _default_sink
+    with _default_sink_lock:
+        if _default_sink is None:
+            sinks = [_default_memory_sink]
+            if AI_METRICS_JSONL_PATH:
+                sinks.append(JSONLMetricsSink(AI_METRICS_JSONL_PATH))
+            _default_sink = FanOutMetricsSink(*sinks)
+        return _default_sink
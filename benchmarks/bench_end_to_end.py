@@ -0,0 +1,328 @@
+# benchmarks/bench_end_to_end.py
+"""
+Times each stage of a campaign on synthetic contact workbooks, from 1k up to 1M rows.
+
+Stages, per workbook size:
+    load            data_handler.load_contacts_from_excel on the generated .xlsx
+    render          placeholder rendering as done for a send (send_pipeline.iter_rendered_batches)
+    render_variants the same with one template per contact language (en/fr)
+    build_versions  email_tool._build_message_versions on the rendered batches
+    brevo_send      email_tool.send_bulk_email_messages, concurrently, against a local Brevo stub
+and once:
+    ai_generate     SmartEmailAgent.generate_email_template with the offline stub backend
+    ai_openai_stub  the same through the OpenAI client against a local OpenAI stub server
+
+Nothing leaves the machine. Stages whose packages are missing (pandas/openpyxl, brevo_python,
+openai) are reported as skipped. Workbooks are generated once and kept in benchmarks/data/.
+Results are written as JSON (benchmarks/results/ by default, named after the commit) and
+--compare checks them against an earlier file: exits with status 1 if a stage got slower
+than --tolerance times its earlier duration.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_end_to_end --sizes 1000,10000,100000
+    python -m benchmarks.bench_end_to_end --sizes 1000000 --stages render,brevo_send
+    python -m benchmarks.bench_end_to_end --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+
+from send_pipeline import iter_rendered_batches, run_send_pipeline
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+ROW_STAGES = ("load", "render", "render_variants", "build_versions", "brevo_send")
+ONCE_STAGES = ("ai_generate", "ai_openai_stub")
+
+HEADER = ["Name", "Email", "Ville", "Date", "Langue", "Montant"]
+FIRST_NAMES = ["Alice", "Bruno", "Chloé", "David", "Emma", "François", "Gabriel", "Hélène", "Inès", "Jules"]
+LAST_NAMES = ["Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy", "Moreau"]
+CITIES = ["Paris", "Lyon", "Marseille", "Bruxelles", "Genève", "Montréal", "Lille", "Nantes"]
+LANGUAGES = ["Français", "English", "fr", "en"]
+
+SUBJECT = "{{Name}}, votre invitation à {{Ville}}"
+BODY = ("Bonjour {{Name}},\n\nNous serons à {{Ville}} le {{Date}} et serions ravis de vous y voir.\n"
+        "Votre avoir de {{Montant}} € reste valable.\n\nÀ bientôt,\nL'équipe")
+VARIANTS = {
+    "fr": {"subject": SUBJECT, "body": BODY},
+    "en": {"subject": "{{Name}}, your invitation to {{Ville}}",
+           "body": "Hello {{Name}},\n\nWe will be in {{Ville}} on {{Date}} and would love to see you.\n"
+                   "Your credit of {{Montant}} € is still valid.\n\nBest regards,\nThe team"},
+}
+
+
+class Skipped(Exception):
+    """A stage could not run here (missing optional package)."""
+
+
+def synthetic_rows(rows, seed=0):
+    """Yields workbook rows (see HEADER); about 1% have a missing or invalid email."""
+    rng = random.Random(seed)
+    start = datetime.date(2025, 1, 1)
+    for i in range(rows):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        roll = rng.random()
+        if roll < 0.005:
+            email = None
+        elif roll < 0.01:
+            email = f"invalid-address-{i}"
+        else:
+            email = f"contact{i}@example.com"
+        date = start + datetime.timedelta(days=rng.randrange(365))
+        yield [name, email, rng.choice(CITIES), date, rng.choice(LANGUAGES), rng.randrange(10, 500)]
+
+
+def synthetic_contacts(rows, seed=0):
+    """The contacts load_contacts_from_excel would return for the synthetic workbook."""
+    contacts = []
+    for name, email, city, date, language, amount in synthetic_rows(rows, seed):
+        if email and "@" in email:
+            contacts.append({"name": name, "email": email, "ville": city, "date": date.strftime("%d/%m/%Y"),
+                             "langue": language, "montant": str(amount)})
+    return contacts
+
+
+def workbook_path(rows, seed=0):
+    """Path of the synthetic workbook, generated (write-only, streamed) if not there yet."""
+    path = os.path.join(DATA_DIR, f"contacts_{rows}_{seed}.xlsx")
+    if not os.path.exists(path):
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise Skipped("openpyxl not installed")
+        os.makedirs(DATA_DIR, exist_ok=True)
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(HEADER)
+        for row in synthetic_rows(rows, seed):
+            sheet.append(row)
+        workbook.save(path + ".tmp")
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def _rendered_batches(contacts, variants=None, batch_size=500):
+    return iter_rendered_batches(contacts, SUBJECT, BODY, True, batch_size=batch_size,
+                                 variants=variants, default_language="fr" if variants else None)
+
+
+# --- Stages: each returns (processed items, extra result fields) ---
+def stage_load(rows, args, state):
+    try:
+        import pandas, openpyxl # noqa: F401 (load_contacts_from_excel needs both)
+    except ImportError as e:
+        raise Skipped(f"{e.name} not installed")
+    path = workbook_path(rows, args.seed)
+    from data_handler import load_contacts_from_excel
+    started = time.perf_counter()
+    contacts, issues = load_contacts_from_excel(path)
+    state["contacts"] = contacts
+    return rows, {"seconds": time.perf_counter() - started, "contacts": len(contacts), "issues": len(issues)}
+
+
+def stage_render(rows, args, state, variants=None):
+    started = time.perf_counter()
+    count = sum(len(batch) for batch in _rendered_batches(state["contacts"], variants, args.batch_size))
+    return count, {"seconds": time.perf_counter() - started}
+
+
+def stage_build_versions(rows, args, state):
+    try:
+        import brevo_python # noqa: F401
+    except ImportError:
+        raise Skipped("brevo_python not installed")
+    from email_tool import _build_message_versions
+    count = 0
+    seconds = 0.0
+    for batch in _rendered_batches(state["contacts"], batch_size=args.batch_size):
+        started = time.perf_counter() # Only the SDK model building is timed, not the rendering
+        count += len(_build_message_versions(batch))
+        seconds += time.perf_counter() - started
+    return count, {"seconds": seconds}
+
+
+def stage_brevo_send(rows, args, state):
+    try:
+        import brevo_python # noqa: F401
+    except ImportError:
+        raise Skipped("brevo_python not installed")
+    from benchmarks.stub_brevo_server import StubBrevoServer
+    import email_tool
+    server = StubBrevoServer(latency=args.brevo_latency).start()
+    configured_host = email_tool.BREVO_API_HOST
+    email_tool.BREVO_API_HOST = server.base_url # As if config.BREVO_API_HOST pointed at the stub
+    try:
+        def send_batch(messages):
+            return email_tool.send_bulk_email_messages("bench@example.com", "Bench", messages)
+
+        sent = failed = 0
+        started = time.perf_counter()
+        for messages, result in run_send_pipeline(_rendered_batches(state["contacts"], batch_size=args.batch_size),
+                                                  send_batch, max_in_flight=args.send_workers + 1,
+                                                  send_workers=args.send_workers):
+            if result.get("status") == "success":
+                sent += len(messages)
+            else:
+                failed += len(messages)
+        seconds = time.perf_counter() - started
+        return sent, {"seconds": seconds, "failed": failed, "requests": server.requests,
+                      "recipients_received": server.recipients}
+    finally:
+        email_tool.BREVO_API_HOST = configured_host
+        server.stop()
+
+
+def stage_ai_generate(args):
+    from email_agent import SmartEmailAgent
+    from llm_backends import StubBackend
+    agent = SmartEmailAgent(backend=StubBackend(latency=args.ai_latency), use_cache=False)
+    started = time.perf_counter()
+    for i in range(args.ai_calls):
+        agent.generate_email_template(f"Benchmark prompt {i}", force_refresh=True)
+    return args.ai_calls, {"seconds": time.perf_counter() - started}
+
+
+def stage_ai_openai_stub(args):
+    try:
+        import openai # noqa: F401
+    except ImportError:
+        raise Skipped("openai not installed")
+    from benchmarks.stub_openai_server import StubOpenAIServer
+    from email_agent import get_shared_agent
+    server = StubOpenAIServer(latency=args.ai_latency).start()
+    try:
+        agent = get_shared_agent(openai_api_key="stub", base_url=server.base_url, backend="openai")
+        agent.cache = None
+        started = time.perf_counter()
+        for i in range(args.ai_calls):
+            agent.generate_email_template(f"Benchmark prompt {i}", force_refresh=True)
+        return args.ai_calls, {"seconds": time.perf_counter() - started, "connections": server.connections}
+    finally:
+        server.stop()
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024 # bytes on macOS, KiB on Linux
+
+
+def _record(results, stage, rows, run):
+    try:
+        count, fields = run()
+    except Skipped as e:
+        entry = {"stage": stage, "rows": rows, "status": "skipped", "reason": str(e)}
+        print(f"{stage:<16}{rows or '-':>9}  skipped ({e})")
+    else:
+        seconds = fields.pop("seconds")
+        entry = {"stage": stage, "rows": rows, "status": "ok", "seconds": seconds,
+                 "items_per_second": count / seconds if seconds > 0 else None, "peak_rss_mb": _peak_rss_mb()}
+        entry.update(fields)
+        print(f"{stage:<16}{rows or '-':>9}{seconds:>10.3f}s{entry['items_per_second'] or 0:>12.0f}/s"
+              f"{entry['peak_rss_mb']:>9.0f} MB")
+    results.append(entry)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    """Prints each stage's duration against the baseline file; returns the regressed entries."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(entry["stage"], entry["rows"]): entry for entry in json.load(f)["results"] if entry["status"] == "ok"}
+    regressions = []
+    print(f"\ncompared with {baseline_path} (tolerance x{tolerance}):")
+    for entry in results:
+        before = baseline.get((entry["stage"], entry["rows"]))
+        if entry["status"] != "ok" or before is None or not before["seconds"]:
+            continue
+        ratio = entry["seconds"] / before["seconds"]
+        regressed = ratio > tolerance
+        if regressed:
+            regressions.append(entry)
+        print(f"{entry['stage']:<16}{entry['rows'] or '-':>9}  {before['seconds']:.3f}s -> {entry['seconds']:.3f}s"
+              f"  x{ratio:.2f}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated workbook row counts (up to 1000000)")
+    parser.add_argument("--stages", default=",".join(ROW_STAGES + ONCE_STAGES), help="Comma-separated stages to run")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data")
+    parser.add_argument("--batch-size", type=int, default=500, help="Recipients per batch / Brevo call")
+    parser.add_argument("--send-workers", type=int, default=4, help="Concurrent Brevo calls in brevo_send")
+    parser.add_argument("--brevo-latency", type=float, default=0.0, help="Brevo stub delay per call, in seconds")
+    parser.add_argument("--ai-calls", type=int, default=50, help="Template generations in the ai_* stages")
+    parser.add_argument("--ai-latency", type=float, default=0.0, help="AI stub delay per call, in seconds")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<date>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.2, help="Slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = set(stages) - set(ROW_STAGES + ONCE_STAGES)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+    if any(not 1 <= size <= 1_048_575 for size in sizes):
+        parser.error("sizes must be between 1 and 1048575 (Excel's row limit, minus the header)")
+
+    results = []
+    print(f"{'stage':<16}{'rows':>9}{'time':>11}{'throughput':>14}{'peak RSS':>10}")
+    for rows in sizes:
+        state = {}
+        if "load" in stages:
+            _record(results, "load", rows, lambda: stage_load(rows, args, state))
+        if "contacts" not in state: # Load skipped: use the same contacts, built in memory
+            state["contacts"] = synthetic_contacts(rows, args.seed)
+        if "render" in stages:
+            _record(results, "render", rows, lambda: stage_render(rows, args, state))
+        if "render_variants" in stages:
+            _record(results, "render_variants", rows, lambda: stage_render(rows, args, state, VARIANTS))
+        if "build_versions" in stages:
+            _record(results, "build_versions", rows, lambda: stage_build_versions(rows, args, state))
+        if "brevo_send" in stages:
+            _record(results, "brevo_send", rows, lambda: stage_brevo_send(rows, args, state))
+    if "ai_generate" in stages:
+        _record(results, "ai_generate", None, lambda: stage_ai_generate(args))
+    if "ai_openai_stub" in stages:
+        _record(results, "ai_openai_stub", None, lambda: stage_ai_openai_stub(args))
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {output}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
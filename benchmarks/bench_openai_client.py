@@ -0,0 +1,59 @@
+# benchmarks/bench_openai_client.py
+"""
+Compares a new SmartEmailAgent/OpenAI client per request (the old Streamlit behaviour)
+with the shared registry from email_agent.get_shared_agent, against a local stub server.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_openai_client --requests 200 --users 8 --latency 0.02
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_openai_server import StubOpenAIServer
+from email_agent import SmartEmailAgent, get_shared_agent
+
+import openai
+
+
+def _run(users, requests, make_agent):
+    def one_request(i):
+        agent = make_agent(i)
+        agent.generate_email_template(f"Benchmark prompt {i}", force_refresh=True)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        list(executor.map(one_request, range(requests)))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--users", type=int, default=8, help="Concurrent simulated sessions")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub server delay per request, in seconds")
+    parser.add_argument("--models", default="gpt-4o,gpt-4o-mini", help="Comma-separated models used round-robin")
+    args = parser.parse_args()
+    models = args.models.split(",")
+
+    print(f"{'mode':<12}{'seconds':>10}{'req/s':>10}{'connections':>13}")
+    for mode in ("per-request", "shared"):
+        server = StubOpenAIServer(latency=args.latency).start()
+        try:
+            if mode == "per-request":
+                def make_agent(i):
+                    client = openai.OpenAI(api_key="stub", base_url=server.base_url)
+                    return SmartEmailAgent(openai_api_key="stub", model=models[i % len(models)], use_cache=False, client=client)
+            else:
+                def make_agent(i):
+                    agent = get_shared_agent(models[i % len(models)], openai_api_key="stub", base_url=server.base_url)
+                    agent.cache = None
+                    return agent
+            elapsed = _run(args.users, args.requests, make_agent)
+            print(f"{mode:<12}{elapsed:>10.2f}{args.requests / elapsed:>10.1f}{server.connections:>13}")
+        finally:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
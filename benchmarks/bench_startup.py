@@ -0,0 +1,113 @@
+# benchmarks/bench_startup.py
+"""
+Measures the cold-start import time of each entry point and checks it against a budget.
+
+Every entry point is imported in a fresh interpreter, several times; the median wall time
+minus that of an empty interpreter is its import time. The slowest packages it pulls in
+(from python -X importtime) are listed to show what to defer next. Exits with status 1 if
+an entry point is over its budget or fails to import, or if the GUI, worker or CLI
+entry point imports Streamlit.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --budget-scale 1.5   # e.g. on a slow CI machine
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Entry point -> (import statement, budget in seconds). The worker is what a background
+# send needs: the send job runner, the Brevo client module and the AI agent.
+ENTRY_POINTS = {
+    "streamlit_app": ("import streamlit_app", 2.0),
+    "gui_app_email": ("import gui_app_email", 1.0),
+    "worker": ("import send_worker, email_tool, email_agent, data_handler", 0.3),
+    "campaign_cli": ("import campaign_cli", 0.3),
+}
+
+# Entry points that must start without importing Streamlit (it is only for the web app)
+STREAMLIT_FREE = ("gui_app_email", "worker", "campaign_cli")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(statement, importtime=False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", statement]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True)
+    return time.perf_counter() - started, result
+
+
+def measure(statement, runs):
+    """Median seconds to run statement in a fresh interpreter, or raises RuntimeError if it fails."""
+    times = []
+    for _ in range(runs):
+        seconds, result = _run(statement)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+        times.append(seconds)
+    return statistics.median(times)
+
+
+def imports_streamlit(statement):
+    """True if running statement in a fresh interpreter leaves streamlit in sys.modules."""
+    _, result = _run(f"{statement}; import sys; print('streamlit' in sys.modules)")
+    return result.stdout.strip().endswith("True")
+
+
+def imported_packages(statement):
+    """{top-level package: cumulative import seconds} for running statement, from -X importtime."""
+    _, result = _run(statement, importtime=True)
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.startswith("  "): # Nested import: already counted in its parent's cumulative time
+            continue
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(cumulative) / 1e6
+    return packages
+
+
+def slowest_packages(statement, exclude=(), limit=5):
+    """[(package, seconds)] for the slowest imports of statement, leaving out those in exclude."""
+    packages = [(package, seconds) for package, seconds in imported_packages(statement).items() if package not in exclude]
+    return sorted(packages, key=lambda item: item[1], reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="Multiplies every budget")
+    parser.add_argument("--entry", action="append", choices=list(ENTRY_POINTS), help="Only these entry points")
+    args = parser.parse_args()
+
+    baseline = measure("pass", args.runs)
+    startup_packages = imported_packages("pass") # Imported by the interpreter itself (site, encodings...)
+    print(f"empty interpreter: {baseline * 1000:.0f} ms (subtracted below)")
+    print(f"{'entry point':<16}{'import (ms)':>12}{'budget (ms)':>13}  slowest imports")
+    failed = False
+    for name in args.entry or ENTRY_POINTS:
+        statement, budget = ENTRY_POINTS[name]
+        budget *= args.budget_scale
+        try:
+            seconds = max(measure(statement, args.runs) - baseline, 0.0)
+        except RuntimeError as e:
+            print(f"{name:<16}{'error':>12}{budget * 1000:>13.0f}  {e}")
+            failed = True
+            continue
+        slowest = ", ".join(f"{package} {package_seconds * 1000:.0f}ms" for package, package_seconds in slowest_packages(statement, startup_packages))
+        over = seconds > budget
+        streamlit_leak = name in STREAMLIT_FREE and imports_streamlit(statement)
+        failed = failed or over or streamlit_leak
+        print(f"{name:<16}{seconds * 1000:>12.0f}{budget * 1000:>13.0f}  {slowest}{'  OVER BUDGET' if over else ''}"
+              f"{'  IMPORTS STREAMLIT' if streamlit_leak else ''}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
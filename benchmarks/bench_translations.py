@@ -0,0 +1,91 @@
+# benchmarks/bench_translations.py
+"""
+Checks that concurrent sessions keep their own translation language, and times _t.
+
+Each simulated session (one thread, like a Streamlit script run) picks a language,
+then translates many strings while the other sessions do the same; any string coming
+back in another session's language is counted as a leak. Exits with status 1 on a leak.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_translations --sessions 64 --calls 20000
+"""
+import argparse
+import sys
+import threading
+import time
+
+from translations import LANGUAGES, TRANSLATIONS, _t, set_language, translate
+
+# A key translated differently in every language, with and without placeholders
+PLAIN_KEY = "Generate Email"
+FORMAT_KEY = "Successfully loaded {count} valid contacts."
+
+
+def _session(index, calls, start, leaks):
+    lang_code = list(LANGUAGES)[index % len(LANGUAGES)]
+    set_language(lang_code)
+    expected_plain = TRANSLATIONS[lang_code][PLAIN_KEY]
+    expected_format = TRANSLATIONS[lang_code][FORMAT_KEY].format(count=index)
+    start.wait() # All sessions translate at the same time
+    for _ in range(calls):
+        if _t(PLAIN_KEY) != expected_plain or _t(FORMAT_KEY, count=index) != expected_format:
+            leaks.append(index)
+            return
+
+
+def run_sessions(sessions, calls):
+    start = threading.Barrier(sessions)
+    leaks = []
+    threads = [threading.Thread(target=_session, args=(i, calls, start, leaks)) for i in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, leaks
+
+
+def check_explicit_locale():
+    """translate() with an explicit language must ignore the session language."""
+    set_language("fr")
+    return translate(PLAIN_KEY, "en") == TRANSLATIONS["en"][PLAIN_KEY]
+
+
+def _format_always(key, lang_code="fr", **kwargs):
+    # The previous _t: every call went through str.format, even without kwargs
+    return TRANSLATIONS.get(lang_code, {}).get(key, key).format(**kwargs)
+
+
+def time_calls(calls):
+    set_language("fr")
+    started = time.perf_counter()
+    for _ in range(calls):
+        _t(PLAIN_KEY)
+    plain = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(calls):
+        _format_always(PLAIN_KEY)
+    formatted = time.perf_counter() - started
+    return plain, formatted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=64, help="Concurrent simulated sessions")
+    parser.add_argument("--calls", type=int, default=20000, help="Translations per session")
+    args = parser.parse_args()
+
+    seconds, leaks = run_sessions(args.sessions, args.calls)
+    print(f"{args.sessions} sessions x {args.calls} calls: {seconds:.2f}s, sessions with a wrong language: {len(leaks)}")
+
+    explicit_ok = check_explicit_locale()
+    print(f"explicit locale ignores the session language: {explicit_ok}")
+
+    plain, formatted = time_calls(args.calls * 10)
+    print(f"_t without kwargs: {plain / (args.calls * 10) * 1e9:.0f} ns/call "
+          f"(always formatting: {formatted / (args.calls * 10) * 1e9:.0f} ns/call)")
+    return 1 if leaks or not explicit_ok else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
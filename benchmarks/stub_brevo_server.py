@@ -0,0 +1,66 @@
+# benchmarks/stub_brevo_server.py
+"""
+Minimal local stand-in for Brevo's transactional email endpoint, used by the benchmarks.
+
+Answers POST /v3/smtp/email with one message id per recipient (per message version for
+batch sends) after an optional delay, and counts requests and recipients it received.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        versions = request.get("messageVersions")
+        count = len(versions) if versions else len(request.get("to", []))
+        self.server.record(count)
+        if versions:
+            payload = {"messageIds": [f"<{uuid.uuid4().hex}@stub>" for _ in range(count)]}
+        else:
+            payload = {"messageId": f"<{uuid.uuid4().hex}@stub>"}
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Keep benchmark output readable
+
+
+class StubBrevoServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, port=0):
+        super().__init__(("127.0.0.1", port), _StubHandler)
+        self.latency = latency
+        self.requests = 0
+        self.recipients = 0
+        self._count_lock = threading.Lock()
+
+    def record(self, recipients):
+        with self._count_lock:
+            self.requests += 1
+            self.recipients += recipients
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v3"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,72 @@
+# benchmarks/stub_openai_server.py
+"""
+Minimal local stand-in for the OpenAI chat completions endpoint, used by the benchmarks.
+
+Answers POST /v1/chat/completions with a fixed JSON email template after an optional
+delay, and counts how many TCP connections clients opened.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_TEMPLATE = {"subject": "Stub subject", "body": "Stub body for {{Name}}.\n\nSee you soon."}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, so connection reuse is visible
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        payload = {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(STUB_TEMPLATE)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 50, "completion_tokens": 30, "total_tokens": 80},
+        }
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Keep benchmark output readable
+
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, port=0):
+        super().__init__(("127.0.0.1", port), _StubHandler)
+        self.latency = latency
+        self.connections = 0
+        self._count_lock = threading.Lock()
+
+    def get_request(self):
+        request = super().get_request()
+        with self._count_lock:
+            self.connections += 1
+        return request
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,273 @@
+# campaign_cli.py
+"""
+Sends a campaign without a UI, e.g. from cron or on a worker machine.
+
+Contacts are loaded from an Excel file, then rendered, batched and sent as a stream
+(see send_pipeline): batch N+1 renders while batch N is with Brevo. Progress, throughput
+and per-stage timing are printed; --result-file writes them as JSON for other tools.
+SIGINT/SIGTERM stop after the batches already sent. Sending the same campaign again
+then skips the recipients that already received it (campaign_control checkpoint).
+
+Exit status: 0 all sent, 1 some recipients failed or sending stopped on an error,
+2 invalid input or configuration, 3 cancelled.
+
+Usage (from the repository root):
+    python campaign_cli.py contacts.xlsx --subject "Hello {{Name}}" --body-file body.txt --personalize
+    python campaign_cli.py contacts.xlsx --prompt "Invite our clients to the spring event" \\
+        --language fr --result-file result.json
+    python campaign_cli.py contacts.xlsx --subject S --body B --dry-run   # render only, send nothing
+"""
+import argparse
+import datetime
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from config import SENDER_EMAIL, BREVO_API_KEY, AI_BACKEND
+from campaign_control import CampaignCheckpoint, CampaignControl, campaign_key
+from send_pipeline import DEFAULT_BATCH_SIZE, DEFAULT_MAX_IN_FLIGHT, iter_rendered_batches, run_send_pipeline
+from agent_metrics import percentile
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_INVALID = 2
+EXIT_CANCELLED = 3
+
+
+def _timed(iterable, timings, stage):
+    """Yields from iterable, adding the time spent producing each item to timings[stage]."""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        item = next(iterator, None)
+        timings[stage] += time.perf_counter() - started
+        if item is None:
+            return
+        yield item
+
+
+def _error(message):
+    print(f"error: {message}", file=sys.stderr)
+    return EXIT_INVALID
+
+
+def _generate_template(args):
+    from email_agent import get_shared_agent # Only needed with --prompt
+    agent = get_shared_agent(backend=args.ai_backend)
+    template = agent.generate_email_template(
+        args.prompt,
+        user_email_context=args.context,
+        output_language=args.language,
+        personalize_emails=args.personalize
+    )
+    if template.get("subject") == "Error":
+        raise ValueError(template.get("body", "AI generation failed"))
+    return template["subject"], template["body"]
+
+
+def _send_function(args, sender_name):
+    if args.dry_run:
+        def send_batch(messages):
+            return {'status': 'success', 'message_ids': [], 'total_sent': len(messages)}
+        return send_batch
+
+    from email_tool import send_bulk_email_messages
+    attachments = args.attach or None
+
+    def send_batch(messages):
+        try:
+            return send_bulk_email_messages(SENDER_EMAIL, sender_name, messages, attachments)
+        except Exception as e: # Reported for the batch; the next batches still go out
+            return {'status': 'error', 'message': f"An unexpected error occurred: {e}"}
+    return send_batch
+
+
+def run_campaign(args):
+    """Runs the campaign described by the parsed arguments. Returns (exit status, result dict)."""
+    from data_handler import load_contacts_from_excel
+
+    started_at = datetime.datetime.now().isoformat(timespec="seconds")
+    wall_started = time.perf_counter()
+    timings = {"load": 0.0, "generate": 0.0, "render": 0.0, "send": 0.0}
+    result = {"status": "invalid", "started_at": started_at, "dry_run": args.dry_run, "timings": timings}
+
+    for path in args.attach or ():
+        if not os.path.isfile(path) or not os.access(path, os.R_OK):
+            result["error"] = f"Cannot read --attach file: {path}"
+            return _error(result["error"]), result
+
+    stage_started = time.perf_counter()
+    contacts, contact_issues = load_contacts_from_excel(args.contacts)
+    timings["load"] = time.perf_counter() - stage_started
+    result["contact_issues"] = len(contact_issues)
+    if not contacts:
+        result["error"] = "; ".join(contact_issues) or "No contacts found."
+        return _error(result["error"]), result
+
+    if args.prompt:
+        stage_started = time.perf_counter()
+        try:
+            subject, body = _generate_template(args)
+        except Exception as e: # Invalid answer, API or client error (e.g. no OpenAI API key)
+            result["error"] = f"AI generation failed: {e}"
+            return _error(result["error"]), result
+        timings["generate"] = time.perf_counter() - stage_started
+    else:
+        subject = args.subject
+        body = args.body
+        if body is None:
+            try:
+                with open(args.body_file, encoding="utf-8") as f:
+                    body = f.read()
+            except OSError as e:
+                result["error"] = f"Cannot read --body-file: {e}"
+                return _error(result["error"]), result
+
+    if not args.allow_unresolved:
+        from email_renderer import find_unresolved_placeholders
+        unresolved = find_unresolved_placeholders([subject, body], contacts, args.personalize)
+        if unresolved:
+            details = ", ".join(f"{{{{{name}}}}} (missing for {count})" for name, count in unresolved.items())
+            result["error"] = f"Placeholders cannot be filled from the contacts file: {details}"
+            return _error(result["error"]), result
+
+    if not args.dry_run and (not SENDER_EMAIL or not BREVO_API_KEY):
+        result["error"] = "SENDER_EMAIL and BREVO_API_KEY must be configured (environment, .env or Streamlit secrets)."
+        return _error(result["error"]), result
+
+    sender_name = args.sender_name or (SENDER_EMAIL.split('@')[0].replace('.', ' ').title() if SENDER_EMAIL else "Sender")
+    key = campaign_key(subject, body, args.personalize, contacts, args.attach)
+    checkpoint = CampaignCheckpoint(key) if not args.dry_run and not args.no_checkpoint else None
+    total = sum(1 for contact in contacts if contact.get('email'))
+    if checkpoint is not None and len(checkpoint):
+        contacts = checkpoint.remaining(contacts)
+    remaining = sum(1 for contact in contacts if contact.get('email'))
+    result.update(campaign=key, subject=subject, recipients={"total": total, "skipped": total - remaining})
+    if total - remaining:
+        print(f"{total - remaining} recipient(s) already received this campaign in an earlier run and are skipped.")
+
+    control = CampaignControl()
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: control.cancel())
+
+    send_batch = _send_function(args, sender_name)
+    latencies = []
+
+    def timed_send(messages):
+        batch_started = time.perf_counter()
+        outcome = send_batch(messages)
+        latencies.append(time.perf_counter() - batch_started)
+        return outcome
+
+    sent = failed = batches = 0
+    failures = []
+    pipeline_error = None
+    send_started = time.perf_counter()
+    try:
+        rendered = _timed(iter_rendered_batches(contacts, subject, body, args.personalize, batch_size=args.batch_size),
+                          timings, "render")
+        for messages, outcome in run_send_pipeline(control.gate(rendered), timed_send,
+                                                   max_in_flight=args.max_in_flight, send_workers=args.send_workers):
+            batches += 1
+            emails = [message["to_email"] for message in messages]
+            if outcome.get("status") == "success":
+                sent += len(messages)
+                if checkpoint is not None:
+                    checkpoint.mark_done(emails)
+            else:
+                failed += len(messages)
+                failures.append({"batch": batches, "error": str(outcome.get("message", "")), "recipients": emails})
+            elapsed = time.perf_counter() - send_started
+            print(f"batch {batches}: {'sent' if outcome.get('status') == 'success' else 'FAILED'} {len(messages)}, "
+                  f"{sent + failed}/{remaining} done, {(sent + failed) / elapsed:.0f} recipients/s", flush=True)
+    except Exception as e: # E.g. a rendering error: the batches not sent yet are reported as not sent
+        pipeline_error = f"{type(e).__name__}: {e}"
+        print(f"error: sending stopped: {pipeline_error}", file=sys.stderr)
+
+    timings["send"] = sum(latencies)
+    timings["wall"] = time.perf_counter() - wall_started
+    pipeline_seconds = time.perf_counter() - send_started
+    if pipeline_error is not None:
+        status, exit_status = "failed", EXIT_FAILURES
+        result["error"] = pipeline_error
+    elif control.cancelled:
+        status, exit_status = "cancelled", EXIT_CANCELLED
+    elif failed:
+        status, exit_status = "completed_with_failures", EXIT_FAILURES
+    else:
+        status, exit_status = "completed", EXIT_OK
+        if checkpoint is not None:
+            checkpoint.discard() # Campaign complete: sending it again is a new campaign
+
+    result["status"] = status
+    result["finished_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+    result["recipients"].update(sent=sent, failed=failed, not_sent=remaining - sent - failed)
+    result["batches"] = batches
+    result["throughput_per_second"] = (sent + failed) / pipeline_seconds if pipeline_seconds > 0 else None
+    result["send_latency"] = {f"p{q}": percentile(latencies, q) for q in (50, 90, 99)}
+    result["failures"] = failures
+    return exit_status, result
+
+
+def _print_summary(result):
+    recipients = result.get("recipients", {})
+    print(f"status: {result['status']}")
+    if recipients:
+        print(f"recipients: {recipients.get('sent', 0)} sent, {recipients.get('failed', 0)} failed, "
+              f"{recipients.get('skipped', 0)} skipped, {recipients.get('not_sent', 0)} not sent "
+              f"(of {recipients.get('total', 0)})")
+    if result.get("throughput_per_second"):
+        print(f"throughput: {result['throughput_per_second']:.1f} recipients/s over {result.get('batches', 0)} batches")
+    print("timing: " + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in result["timings"].items()))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("contacts", help="Excel file (.xlsx/.xls) with an email column")
+    template = parser.add_argument_group("template (either --subject with --body/--body-file, or --prompt)")
+    template.add_argument("--subject", help="Subject, may contain {{Column}} placeholders")
+    template.add_argument("--body", help="Body text, may contain {{Column}} placeholders")
+    template.add_argument("--body-file", help="File with the body text")
+    template.add_argument("--prompt", help="Have the AI agent write the email from this request")
+    template.add_argument("--context", default="", help="Additional context or tone for --prompt")
+    template.add_argument("--language", default="en", help="Language of the generated email (default: en)")
+    template.add_argument("--ai-backend", default=AI_BACKEND, choices=["openai", "stub"],
+                          help=f"Model backend for --prompt (default: {AI_BACKEND})")
+    parser.add_argument("--personalize", action="store_true",
+                        help="Fill name placeholders per contact; off by default, as in the web app "
+                             "(without it everyone gets the same text)")
+    parser.add_argument("--allow-unresolved", action="store_true", help="Send even if placeholders cannot be filled")
+    parser.add_argument("--attach", action="append", help="File to attach to every email (repeatable)")
+    parser.add_argument("--sender-name", help="Display name of the sender (default: derived from SENDER_EMAIL)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Recipients per Brevo call")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT, help="Batches queued or being sent")
+    parser.add_argument("--send-workers", type=int, default=1, help="Batches sent concurrently")
+    parser.add_argument("--no-checkpoint", action="store_true", help="Neither skip nor record already sent recipients")
+    parser.add_argument("--dry-run", action="store_true", help="Load and render everything but send nothing")
+    parser.add_argument("--result-file", help="Write the result (status, counts, timing, failures) to this JSON file")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.prompt and (not args.subject or (args.body is None and not args.body_file)):
+        parser.error("give --subject with --body or --body-file, or --prompt")
+    if not 1 <= args.batch_size <= 2000:
+        parser.error("--batch-size must be between 1 and 2000 (Brevo limit)")
+
+    exit_status, result = run_campaign(args)
+    result["exit_status"] = exit_status
+    _print_summary(result)
+    if args.result_file:
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    return exit_status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# campaign_control.py
+import hashlib
+import json
+import os
+import threading
+import time
+
+from config import CAMPAIGN_CHECKPOINT_DIR, CAMPAIGN_CHECKPOINT_TTL_SECONDS
+from shared_store import content_key
+
+
+class CampaignControl:
+    """
+    Pause, resume and cancel flags for a campaign, shared by the sending thread and the UI.
+
+    They act at batch granularity: gate() stops handing out batches while paused and ends
+    on cancel, and batches already given to the email service are not interrupted.
+    """
+    def __init__(self):
+        self._running = threading.Event() # Set unless paused
+        self._running.set()
+        self._cancelled = threading.Event()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set() # Wake a paused sender so it can stop
+
+    def gate(self, batches):
+        """
+        Yields from batches (lazily, e.g. send_pipeline.iter_rendered_batches), waiting while
+        paused and stopping once cancelled. The next batch is only pulled (so rendered)
+        when it may be sent.
+        """
+        iterator = iter(batches)
+        while True:
+            self._running.wait()
+            if self.cancelled:
+                return
+            batch = next(iterator, None)
+            if batch is None:
+                return
+            yield batch
+
+
+def _attachment_digest(attachment):
+    """SHA-256 of an attachment given as a file path or as a (filename, bytes) pair."""
+    digest = hashlib.sha256()
+    if isinstance(attachment, str):
+        with open(attachment, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    digest.update(attachment[1])
+    return digest.hexdigest()
+
+
+def campaign_key(subject, body, personalize, contacts, attachments=None, variants=None):
+    """
+    Identifies a campaign by its content, recipients and attachments, so sending the same
+    campaign again finds its checkpoint while the same text sent to another contact list
+    (or with other files) starts a new one.
+    """
+    emails = sorted({contact.get('email') for contact in contacts if contact.get('email')})
+    content = {
+        "subject": subject, "body": body, "personalize": personalize, "variants": variants or {},
+        "recipients": hashlib.sha256("\n".join(emails).encode("utf-8")).hexdigest(),
+        "attachments": sorted(_attachment_digest(attachment) for attachment in attachments or ()),
+    }
+    return content_key("campaign", json.dumps(content, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+
+
+def sweep_checkpoints(directory=CAMPAIGN_CHECKPOINT_DIR, ttl_seconds=CAMPAIGN_CHECKPOINT_TTL_SECONDS):
+    """Removes checkpoint files not written to for ttl_seconds. Returns how many were removed."""
+    if not directory or ttl_seconds is None or not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - ttl_seconds
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if name.endswith(".jsonl") and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass # Removed meanwhile by another run
+    return removed
+
+
+class CampaignCheckpoint:
+    """
+    The recipients a campaign was already sent to, kept in an append-only JSON-lines file
+    (one line per sent batch) so an interrupted, cancelled or crashed run can be resumed.
+
+    remaining() drops those recipients before anything is rendered. Failed recipients are
+    not recorded and are retried. discard() removes the file once the campaign is complete;
+    checkpoints of campaigns never completed expire ttl_seconds after their last batch.
+    """
+    def __init__(self, key, directory=CAMPAIGN_CHECKPOINT_DIR, ttl_seconds=CAMPAIGN_CHECKPOINT_TTL_SECONDS):
+        self.key = key
+        self.path = os.path.join(directory, key.replace(":", "-") + ".jsonl") if directory else None
+        self.done = set()
+        self._lock = threading.Lock()
+        sweep_checkpoints(directory, ttl_seconds) # Includes this campaign's own file once it is too old
+        if self.path and os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.done.update(json.loads(line))
+                    except ValueError:
+                        pass # Partly written last line of a crashed run
+
+    def __len__(self):
+        return len(self.done)
+
+    def remaining(self, contacts):
+        """Contacts not sent yet, in their original order."""
+        done = self.done
+        return [contact for contact in contacts if contact.get('email') not in done]
+
+    def mark_done(self, emails):
+        with self._lock:
+            emails = [email for email in emails if email not in self.done]
+            if not emails:
+                return
+            self.done.update(emails)
+            if self.path:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(emails, ensure_ascii=False) + "\n")
+
+    def discard(self):
+        with self._lock:
+            self.done.clear()
+            if self.path:
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
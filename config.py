@@ -1,21 +1,137 @@
 # config.py - Consolidated Secrets Access and Log Path
 
-import streamlit as st
+import functools
 import os # Import the os module to access environment variables
+import sys
 
 # --- SECRETS CONFIGURATION ---
-# Get the entire 'app_credentials' section as a dictionary from Streamlit Secrets
-APP_CREDENTIALS = st.secrets.get("app_credentials", {})
-
-# Extract individual credentials from the APP_CREDENTIALS dictionary
-SENDER_EMAIL = APP_CREDENTIALS.get("SENDER_EMAIL")
-# SENDER_PASSWORD is no longer needed for Brevo API authentication.
-OPENAI_API_KEY = APP_CREDENTIALS.get("OPENAI_API_KEY")
-BREVO_API_KEY = APP_CREDENTIALS.get("BREVO_API_KEY")
+# Credentials are resolved lazily, on first access (e.g. `from config import BREVO_API_KEY`),
+# looking in this order at:
+#   1. environment variables,
+#   2. the local file LOCAL_SECRETS_FILE (KEY=value lines),
+#   3. the 'app_credentials' section of Streamlit secrets.
+# Under Streamlit (streamlit already imported) its secrets API is used; elsewhere (GUI, CLI,
+# workers) the same secrets.toml files are read directly, so config never imports Streamlit.
+SECRET_NAMES = (
+    "SENDER_EMAIL",
+    # SENDER_PASSWORD is no longer needed for Brevo API authentication.
+    "OPENAI_API_KEY",
+    "BREVO_API_KEY",
+    # Optional: point the OpenAI client at another OpenAI-compatible endpoint (e.g. a local stub for benchmarks)
+    "OPENAI_BASE_URL",
+    # Optional: send Brevo API calls to another host (e.g. the local stub used by the benchmarks)
+    "BREVO_API_HOST",
+)
+LOCAL_SECRETS_FILE = os.environ.get("AI_MAIL_SECRETS_FILE", ".env")
+# Where Streamlit looks for secrets; a value in the project file wins over the global one.
+STREAMLIT_SECRETS_FILES = (
+    os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+    os.path.join(".streamlit", "secrets.toml"),
+)
 
 # The SENDER_CREDENTIALS dictionary is also no longer necessary
 # as Brevo uses API keys for authentication.
 
+@functools.lru_cache(maxsize=None)
+def _local_secrets():
+    if not os.path.exists(LOCAL_SECRETS_FILE):
+        return {}
+    from dotenv import dotenv_values
+    return dotenv_values(LOCAL_SECRETS_FILE)
+
+def _read_streamlit_secrets_files():
+    """The 'app_credentials' sections of STREAMLIT_SECRETS_FILES, read without Streamlit."""
+    try:
+        import tomllib
+    except ImportError: # Python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            return {}
+    credentials = {}
+    for path in STREAMLIT_SECRETS_FILES:
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, "rb") as f:
+                credentials.update(tomllib.load(f).get("app_credentials", {}))
+        except (OSError, tomllib.TOMLDecodeError):
+            pass # Unreadable or invalid file: Streamlit itself would refuse it too
+    return credentials
+
+@functools.lru_cache(maxsize=None)
+def _streamlit_secrets():
+    st = sys.modules.get("streamlit")
+    if st is None: # Not running under Streamlit: read its secrets files rather than importing it
+        return _read_streamlit_secrets_files()
+    try:
+        # Get the entire 'app_credentials' section as a dictionary from Streamlit Secrets
+        return dict(st.secrets.get("app_credentials", {}))
+    except Exception: # Streamlit missing, or no secrets file outside a Streamlit deployment
+        return {}
+
+def get_secret(name, default=None):
+    """Returns a credential from the environment, the local secrets file or Streamlit secrets."""
+    for source in (lambda: os.environ, _local_secrets, _streamlit_secrets): # Later sources only if needed
+        value = source().get(name)
+        if value:
+            return value
+    return default
+
+def __getattr__(name):
+    # Module-level attribute hook: only called for names not defined yet, i.e. the credentials
+    if name in SECRET_NAMES:
+        value = get_secret(name)
+        globals()[name] = value # Resolved once; later accesses are plain attribute reads
+        return value
+    if name == "APP_CREDENTIALS":
+        return {secret: get_secret(secret) for secret in SECRET_NAMES}
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # --- LOGGING CONFIGURATION ---
 # Path for logging failed email attempts. This is not a secret.
-FAILED_EMAILS_LOG_PATH = "failed_emails.log" # This path will be created in your app's root directory on Streamlit Cloud
\ No newline at end of file
+FAILED_EMAILS_LOG_PATH = "failed_emails.log" # This path will be created in your app's root directory on Streamlit Cloud
+# Activity log of the desktop app, appended to while it runs.
+SENDING_LOG_PATH = os.path.join("logs", "sending_log.txt")
+
+# --- AI TEMPLATE CACHE ---
+# SQLite file used to keep generated templates across restarts, and how long they stay valid.
+TEMPLATE_CACHE_PATH = "template_cache.sqlite3"
+TEMPLATE_CACHE_TTL_SECONDS = 7 * 24 * 3600 # One week
+
+# --- AI METRICS ---
+# Optional JSONL file receiving one line per AI agent call (timing, tokens, cache status, errors).
+# None keeps the metrics in memory only.
+AI_METRICS_JSONL_PATH = None
+
+# --- AI LATENCY CONTROLS ---
+# Maximum seconds to wait for a template from the main model (None = wait forever).
+AI_DEADLINE_SECONDS = 30
+# Send a second, identical request if the first has not answered after this many seconds (None = never).
+AI_HEDGE_AFTER_SECONDS = None
+# Faster model asked when the main model misses its deadline (None = no fallback), and its own deadline.
+AI_FALLBACK_MODEL = "gpt-4o-mini"
+AI_FALLBACK_DEADLINE_SECONDS = 20
+
+# Minimum estimated similarity (0-1) for an earlier prompt's template to be offered for a new prompt.
+PROMPT_SIMILARITY_THRESHOLD = 0.8
+
+# Model backend used by the AI agent: "openai", or "stub" for offline benchmarks and load tests
+# (deterministic answers, no network, no API key needed).
+AI_BACKEND = "openai"
+# Seconds each call to the stub backend takes.
+AI_STUB_LATENCY_SECONDS = 0.5
+
+# --- SESSION RESOURCES ---
+# Attachments a session may keep in memory, and the largest contact set kept in memory (contacts are
+# shared by every session that uploaded the same workbook); larger data is spilled to SESSION_SPILL_DIR.
+SESSION_MEMORY_BUDGET_BYTES = 50 * 1024 * 1024
+# Sessions unused for this many seconds have their contacts and attachments freed.
+SESSION_IDLE_TIMEOUT_SECONDS = 2 * 3600
+SESSION_SPILL_DIR = "session_spill"
+
+# --- CAMPAIGNS ---
+# Recipients already sent to, per campaign, so an interrupted send resumes where it stopped (None = not kept).
+CAMPAIGN_CHECKPOINT_DIR = "campaign_checkpoints"
+# A checkpoint not written to for this long is deleted: sending that campaign again starts over (None = never).
+CAMPAIGN_CHECKPOINT_TTL_SECONDS = 7 * 24 * 3600 # One week
@@ -1,12 +1,51 @@
 # data_handler.py
-import pandas as pd
+import datetime
 import re # Import regex for more robust email pattern checking
+from email_renderer import normalize_field
+
+# pandas is imported by _pandas() on the first workbook load: it is by far the slowest
+# import of the app and the GUI and workers don't need it until then.
+pd = None
+
+
+def _pandas():
+    global pd
+    if pd is None:
+        import pandas
+        pd = pandas
+    return pd
+
+
+def _format_cell(value):
+    """
+    Converts a spreadsheet cell into the text that will be put in the email.
+    Empty cells become '' so they are reported as unresolved placeholders.
+    """
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    if isinstance(value, (pd.Timestamp, datetime.datetime)):
+        # Excel stores plain dates as midnight timestamps; don't print the time for those
+        if value.hour == 0 and value.minute == 0 and value.second == 0:
+            return value.strftime("%d/%m/%Y")
+        return value.strftime("%d/%m/%Y %H:%M")
+    if isinstance(value, datetime.date):
+        return value.strftime("%d/%m/%Y")
+    if isinstance(value, datetime.time):
+        return value.strftime("%H:%M")
+    if isinstance(value, float) and value.is_integer():
+        # Integer columns with blanks are read as floats (e.g. 12.0)
+        return str(int(value))
+    return str(value).strip()
+
 
 def load_contacts_from_excel(file_path):
     """
     Loads contacts from an Excel file, dynamically identifies 'email' and 'name' columns,
     and returns a list of dictionaries with 'name' and 'email' keys.
+    Every other column is kept too, under its lowercased header (e.g. 'date', 'lieu'),
+    so it can be used as a '{{Column}}' placeholder in the email template.
     """
+    pd = _pandas()
     try:
         df = pd.read_excel(file_path)
     except Exception as e:
@@ -67,12 +106,20 @@ def load_contacts_from_excel(file_path):
                 break
     
     # If still no name column found (e.g., only email column exists), we will use a fallback name below
-    
+
+    # --- Extra Columns (available as placeholders) ---
+    # Formatted column by column rather than cell by cell inside the row loop below
+    extra_columns = [
+        col for col in df.columns
+        if col not in (email_col_name, name_col_name) and normalize_field(col) not in ('name', 'email')
+    ]
+    extra_values = {normalize_field(col): df[col].map(_format_cell).tolist() for col in extra_columns}
+
     # --- Process Contacts ---
     contacts = []
     contact_issues = []
 
-    for index, row in df.iterrows():
+    for position, (index, row) in enumerate(df.iterrows()):
         # Get email using the identified column, defaulting to empty string if not found or NaN
         # *** MODIFIED LINE HERE ***
         email = str(row[email_col_name]).strip().lower().replace(" ", "") if pd.notna(row[email_col_name]) else ''
@@ -86,7 +133,10 @@ def load_contacts_from_excel(file_path):
         # Basic email validation: must not be empty and must contain '@' and match basic regex pattern
         # This will catch most obvious invalid formats, but not non-existent addresses
         if email and re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
-            contacts.append({"name": name, "email": email})
+            contact = {"name": name, "email": email}
+            for key, values in extra_values.items():
+                contact[key] = values[position]
+            contacts.append(contact)
         else:
             # Log issues including the name detected, even if it's a fallback "Contact X"
             contact_issues.append(f"Row {index + 2}: Invalid or missing email for '{name}' (Email: '{email}').") # +2 for header row and 0-indexing
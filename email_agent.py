@@ -1,41 +1,131 @@
 # email_agent.py
 
-import openai
+import asyncio
 import json
 import re
 import os
-from config import OPENAI_API_KEY
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import (OPENAI_API_KEY, OPENAI_BASE_URL, AI_DEADLINE_SECONDS, AI_HEDGE_AFTER_SECONDS,
+                    AI_FALLBACK_MODEL, AI_FALLBACK_DEADLINE_SECONDS, AI_BACKEND, AI_STUB_LATENCY_SECONDS)
+from template_cache import get_default_cache
+from json_stream import IncrementalJSONObjectParser
+from email_renderer import render_contact
+from agent_metrics import make_record, get_default_metrics_sink
+from llm_backends import OpenAIBackend, StubBackend
+
+# Model used for templates unless another one is asked for
+DEFAULT_MODEL = "gpt-4o"
+
+# Approximate OpenAI list prices in USD per 1M tokens (input, output), used for cost budgets.
+MODEL_PRICING = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# Process-wide registries: one OpenAI client per (API key, base URL) and one agent per model.
+# The OpenAI client is thread-safe and keeps a pool of open HTTPS connections, so sharing it
+# avoids a new connection pool and TLS handshake on every Streamlit click.
+_clients = {}
+_agents = {}
+_registry_lock = threading.Lock()
+
+# Runs deadline-bounded and hedged requests so the caller can stop waiting at the deadline
+_deadline_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="ai-request")
+
+
+def _openai_api_errors():
+    """
+    The exception class to catch for OpenAI API errors. If the openai package was never
+    imported (e.g. with the stub backend), no such error can occur and nothing is matched.
+    """
+    openai = sys.modules.get("openai")
+    return openai.APIError if openai is not None else ()
+
+
+def get_openai_client(openai_api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL):
+    """Returns the shared OpenAI client for this API key and endpoint, creating it on first use."""
+    key = (openai_api_key, base_url)
+    with _registry_lock:
+        client = _clients.get(key)
+        if client is None:
+            import openai # Deferred: the SDK takes a noticeable time to import
+            client = openai.OpenAI(api_key=openai_api_key, base_url=base_url)
+            _clients[key] = client
+        return client
+
+
+def create_backend(name=AI_BACKEND, openai_api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL):
+    """Returns the model backend configured by name: "openai" (shared client) or "stub" (offline)."""
+    if name == "stub":
+        return StubBackend(latency=AI_STUB_LATENCY_SECONDS)
+    if name == "openai":
+        return OpenAIBackend(get_openai_client(openai_api_key, base_url))
+    raise ValueError(f"Unknown AI backend: {name}")
+
+
+def get_shared_agent(model=DEFAULT_MODEL, openai_api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, backend=AI_BACKEND):
+    """
+    Returns the shared SmartEmailAgent for a model. Several models can be used at once;
+    agents for the same API key and endpoint all use one client.
+    """
+    key = (model, openai_api_key, base_url, backend)
+    with _registry_lock:
+        agent = _agents.get(key)
+    if agent is None:
+        llm_backend = create_backend(backend, openai_api_key, base_url)
+        with _registry_lock:
+            agent = _agents.get(key)
+            if agent is None:
+                agent = SmartEmailAgent(openai_api_key=openai_api_key, model=model, backend=llm_backend)
+                _agents[key] = agent
+    return agent
+
 
 class SmartEmailAgent:
     """
     A unified AI agent for generating email content using OpenAI's models.
     It can generate a general email template with placeholders based on a user's prompt.
+    The model is reached through a backend (see llm_backends): OpenAI by default, or an
+    offline stub for benchmarks.
     """
-    def __init__(self, openai_api_key=OPENAI_API_KEY, model="gpt-4o"):
-        if not openai_api_key:
+    def __init__(self, openai_api_key=OPENAI_API_KEY, model=DEFAULT_MODEL, cache=None, use_cache=True, client=None,
+                 metrics_sink=None, deadline=AI_DEADLINE_SECONDS, hedge_after=AI_HEDGE_AFTER_SECONDS,
+                 fallback_model=AI_FALLBACK_MODEL, fallback_deadline=AI_FALLBACK_DEADLINE_SECONDS, backend=None):
+        if backend is None and not openai_api_key:
             raise ValueError("OpenAI API Key is required for SmartEmailAgent.")
             
         self.openai_api_key = openai_api_key
-        # Initialize the OpenAI client here
-        self.client = openai.OpenAI(api_key=self.openai_api_key)
+        if backend is None:
+            # Reuse the process-wide client (and its HTTP connection pool) unless one is given
+            backend = OpenAIBackend(client or get_openai_client(self.openai_api_key))
+        self.backend = backend
         self.model = model
+        # Latency controls: overall deadline, optional hedged duplicate request, faster fallback model
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.fallback_model = fallback_model
+        self.fallback_deadline = fallback_deadline
+        # Generated templates are cached (memory LRU + SQLite); the process-wide cache is used by default
+        self.cache = (cache or get_default_cache()) if use_cache else None
+        # Every call is timed and reported here (in-memory by default, see agent_metrics)
+        self.metrics_sink = metrics_sink or get_default_metrics_sink()
+        # Agents are shared between threads (see get_shared_agent), so per-call state is thread-local
+        self._call_state = threading.local()
 
-    def generate_email_template(self, prompt, user_email_context="", output_language="en", personalize_emails=False):
-        """
-        Generates an email subject and body template using OpenAI's GPT model.
-        The template will contain placeholders like {{Name}} and {{Email}}.
-        
-        Args:
-            prompt (str): The user's request for the email content.
-            user_email_context (str): Additional context or style preferences for the email.
-            output_language (str): The desired language for the email output (e.g., "en", "fr").
-            personalize_emails (bool): If True, the agent should include personalization placeholders.
+    @property
+    def last_cache_status(self):
+        """"hit", "similar", "miss" or "bypass" for the latest generate_email_template call made by this thread."""
+        return getattr(self._call_state, "cache_status", None)
 
-        Returns:
-            dict: A dictionary containing 'subject' and 'body' of the generated email template.
-                  Returns error message if generation fails.
-        """
-        
+    @last_cache_status.setter
+    def last_cache_status(self, value):
+        self._call_state.cache_status = value
+
+    def _build_messages(self, prompt, user_email_context, output_language, personalize_emails):
+        """Builds the chat messages sent to the model for a template request."""
         personalization_hint = ""
         if personalize_emails:
             # If personalization is ON, instruct AI to use placeholders.
@@ -61,43 +151,411 @@ class SmartEmailAgent:
         if user_email_context:
             user_message_content += f"\nAdditional context/style: {user_email_context}"
 
+        return [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message_content}
+        ]
+
+    @staticmethod
+    def _parse_email(response_content):
+        """Parses and validates a {subject, body} JSON answer, trimming the body. Raises json.JSONDecodeError or ValueError."""
+        email = json.loads(response_content)
+
+        # Basic validation
+        if "subject" not in email or "body" not in email:
+            raise ValueError("AI response missing 'subject' or 'body' key.")
+        email['body'] = email['body'].strip()
+        return email
+
+    @staticmethod
+    def _parse_template(response_content):
+        """Parses and cleans the model's template answer (see _parse_email), dropping any salutation."""
+        email_template = SmartEmailAgent._parse_email(response_content)
+
+        # Further refinement: Remove common salutations if they accidentally slipped through
+        # This is a fallback in case the AI ignores the system prompt.
+        common_salutations_regex = r"^(Dear|Hello|Hi|Bonjour|Salut|Chers?|Cher|Chère)\s+[^,\n]*[,!.]?\s*\n\n*"
+        email_template['body'] = re.sub(common_salutations_regex, "", email_template['body'], flags=re.IGNORECASE | re.MULTILINE)
+        email_template['body'] = email_template['body'].strip()
+
+        return email_template
+
+    def _record_call(self, operation, started, usage=None, error=None, first_token_at=None, model=None):
+        """Sends one call's timing, token usage, cache status and error class to the metrics sink."""
+        if self.metrics_sink is None:
+            return
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message_content}
-                ],
-                response_format={"type": "json_object"}
-            )
-            
-            # Extract content and parse JSON
-            response_content = response.choices[0].message.content
-            email_template = json.loads(response_content)
+            self.metrics_sink.record(make_record(
+                operation,
+                model or self.model,
+                time.perf_counter() - started,
+                time_to_first_token=first_token_at - started if first_token_at is not None else None,
+                prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+                cache_status=self.last_cache_status if operation.startswith("generate") else None,
+                error=error
+            ))
+        except Exception as e:
+            print(f"Failed to record AI agent metrics: {e}") # Metrics must never break generation
 
-            # Basic validation
-            if "subject" not in email_template or "body" not in email_template:
-                raise ValueError("AI response missing 'subject' or 'body' key.")
-            
-            # Clean up body to remove potential leading/trailing whitespace or accidental AI salutations
-            email_template['body'] = email_template['body'].strip()
-            # Further refinement: Remove common salutations if they accidentally slipped through
-            # This is a fallback in case the AI ignores the system prompt.
-            common_salutations_regex = r"^(Dear|Hello|Hi|Bonjour|Salut|Chers?|Cher|Chère)\s+[^,\n]*[,!.]?\s*\n\n*"
-            email_template['body'] = re.sub(common_salutations_regex, "", email_template['body'], flags=re.IGNORECASE | re.MULTILINE)
-            email_template['body'] = email_template['body'].strip()
+    def _cache_lookup(self, prompt, user_email_context, output_language, personalize_emails, force_refresh):
+        """Returns (cache_key, cached_template_or_None) and records the cache status of this call."""
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(self.model, prompt, user_email_context, output_language, personalize_emails)
+            if not force_refresh:
+                cached_template = self.cache.get(cache_key)
+                if cached_template is not None:
+                    self.last_cache_status = "hit"
+                    return cache_key, cached_template
+        self.last_cache_status = "bypass" if force_refresh or self.cache is None else "miss"
+        return cache_key, None
+
+    def _cache_scope(self, user_email_context, output_language, personalize_emails):
+        return self.cache.make_scope(self.model, user_email_context, output_language, personalize_emails)
+
+    def find_similar_template(self, prompt, user_email_context="", output_language="en", personalize_emails=False):
+        """
+        Looks for a cached template generated from a prompt worded almost the same way
+        (e.g. "invite to gala" / "invitation to the gala"), with the same settings.
+
+        Returns:
+            dict: {'template': {'subject', 'body'}, 'prompt': earlier prompt, 'similarity': 0-1}, or None.
+        """
+        if self.cache is None:
+            return None
+        return self.cache.find_similar(prompt, self._cache_scope(user_email_context, output_language, personalize_emails))
+
+    def _complete(self, messages, model, timeout):
+        """One JSON chat completion. Returns (content, usage, model); raises on API errors."""
+        # The timeout makes abandoned hedges/primaries stop on their own at the deadline
+        content, usage = self.backend.complete(model, messages, timeout=timeout)
+        return content, usage, model
+
+    def _complete_within_deadline(self, messages, deadline):
+        """
+        Runs the completion with a deadline, an optional hedged duplicate and a fallback model.
+
+        - If no answer arrived after hedge_after seconds, a second identical request is sent;
+          whichever answers first wins.
+        - If the deadline passes with no answer, the fallback model is asked, with its own deadline.
+        - Requests that lost the race are cancelled if not started yet, and otherwise end at
+          their own timeout; their results are ignored.
+
+        Returns:
+            tuple: (content, usage, model_used). Raises TimeoutError if nothing answered in time,
+                   or the request's own error if every attempt failed.
+        """
+        if not deadline and not self.hedge_after:
+            return self._complete(messages, self.model, None)
+
+        started = time.monotonic()
+        deadline_at = started + deadline if deadline else None
+        hedge_at = started + self.hedge_after if self.hedge_after else None
+        pending = {_deadline_executor.submit(self._complete, messages, self.model, deadline)}
+        last_error = None
+        try:
+            while pending:
+                now = time.monotonic()
+                wake_times = [t for t in (deadline_at, hedge_at) if t is not None]
+                timeout = max(0.0, min(wake_times) - now) if wake_times else None
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    last_error = future.exception()
+
+                now = time.monotonic()
+                if hedge_at is not None and now >= hedge_at:
+                    hedge_at = None
+                    if pending: # Primary still running: race it with a duplicate request
+                        remaining = deadline_at - now if deadline_at else None
+                        pending.add(_deadline_executor.submit(self._complete, messages, self.model, remaining))
+                if deadline_at is not None and now >= deadline_at:
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
 
+        if last_error is not None and not pending:
+            raise last_error # Every attempt failed before the deadline
+        if self.fallback_model and self.fallback_model != self.model:
+            return self._complete(messages, self.fallback_model, self.fallback_deadline)
+        raise TimeoutError(f"{self.model} did not answer within {deadline} seconds.")
 
+    def generate_email_template(self, prompt, user_email_context="", output_language="en", personalize_emails=False, force_refresh=False,
+                                deadline=None, reuse_similar=False):
+        """
+        Generates an email subject and body template using OpenAI's GPT model.
+        The template will contain placeholders like {{Name}} and {{Email}}.
+        Successful results of the agent's own model are cached (not those of the fallback
+        model); an identical request is answered from the cache.
+        
+        Args:
+            prompt (str): The user's request for the email content.
+            user_email_context (str): Additional context or style preferences for the email.
+            output_language (str): The desired language for the email output (e.g., "en", "fr").
+            personalize_emails (bool): If True, the agent should include personalization placeholders.
+            force_refresh (bool): If True, skip the cache lookup and generate a fresh template.
+            deadline (float): Seconds to wait for the model; defaults to the agent's deadline.
+            reuse_similar (bool): If True, a cached template of a near-identical prompt is returned
+                                  instead of calling the model.
+
+        Returns:
+            dict: A dictionary containing 'subject' and 'body' of the generated email template.
+                  Returns error message if generation fails.
+        """
+        started = time.perf_counter()
+        cache_key, cached_template = self._cache_lookup(prompt, user_email_context, output_language, personalize_emails, force_refresh)
+        if cached_template is None and reuse_similar and not force_refresh:
+            similar = self.find_similar_template(prompt, user_email_context, output_language, personalize_emails)
+            if similar is not None:
+                self.last_cache_status = "similar"
+                cached_template = similar['template']
+        if cached_template is not None:
+            self._record_call("generate_email_template", started)
+            return cached_template
+
+        messages = self._build_messages(prompt, user_email_context, output_language, personalize_emails)
+        response_content = ""
+        usage = None
+        error = None
+        model_used = self.model
+        try:
+            # Bounded by the deadline; may be hedged or answered by the fallback model
+            response_content, usage, model_used = self._complete_within_deadline(
+                messages, self.deadline if deadline is None else deadline
+            )
+            
+            # Parse JSON
+            email_template = self._parse_template(response_content)
+
+            # A fallback model's answer is not cached under this model's key: the next request retries it
+            if self.cache is not None and model_used == self.model:
+                self.cache.set(cache_key, email_template, time.perf_counter() - started, prompt=prompt,
+                               scope=self._cache_scope(user_email_context, output_language, personalize_emails))
             return email_template
 
+        except TimeoutError as e:
+            error = type(e).__name__
+            return {"subject": "Error", "body": f"AI generation timed out: {e}"}
         except json.JSONDecodeError as e:
+            error = type(e).__name__
             return {"subject": "Error", "body": f"Failed to parse AI response (JSON error): {e}. Raw: {response_content}"}
         except ValueError as e:
+            error = type(e).__name__
             return {"subject": "Error", "body": f"AI response validation error: {e}. Raw: {response_content}"}
-        except openai.APIError as e:
+        except _openai_api_errors() as e:
+            error = type(e).__name__
             return {"subject": "Error", "body": f"OpenAI API Error: {e}"}
         except Exception as e:
+            error = type(e).__name__
             return {"subject": "Error", "body": f"An unexpected error occurred: {e}"}
+        finally:
+            self._record_call("generate_email_template", started, usage=usage, error=error, model=model_used)
+
+    def generate_email_template_stream(self, prompt, user_email_context="", output_language="en", personalize_emails=False, force_refresh=False):
+        """
+        Streaming variant of generate_email_template.
+
+        Yields dicts with 'subject', 'body' and 'done' keys as tokens arrive. Intermediate
+        items (done=False) hold the partial text decoded so far; the last item (done=True)
+        is the same validated and cleaned template generate_email_template would return,
+        or an error template. A malformed answer is detected on the first bad character
+        and the stream is abandoned right away.
+        """
+        started = time.perf_counter()
+        cache_key, cached_template = self._cache_lookup(prompt, user_email_context, output_language, personalize_emails, force_refresh)
+        if cached_template is not None:
+            self._record_call("generate_email_template_stream", started)
+            yield dict(cached_template, done=True)
+            return
+
+        messages = self._build_messages(prompt, user_email_context, output_language, personalize_emails)
+        parser = IncrementalJSONObjectParser()
+        chunks = []
+        stream = None
+        usage = None
+        first_token_at = None
+        error = None
+        try:
+            stream = self.backend.stream(self.model, messages, timeout=self.deadline)
+            for delta, chunk_usage in stream:
+                if self.deadline and time.perf_counter() - started > self.deadline:
+                    raise TimeoutError(f"{self.model} did not finish within {self.deadline} seconds.")
+                if chunk_usage:
+                    usage = chunk_usage
+                if not delta:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                chunks.append(delta)
+                values = parser.feed(delta) # Raises ValueError as soon as the structure is wrong
+                yield {"subject": values.get("subject", ""), "body": values.get("body", ""), "done": False}
+
+            response_content = "".join(chunks)
+            email_template = self._parse_template(response_content)
+            if self.cache is not None:
+                self.cache.set(cache_key, email_template, time.perf_counter() - started, prompt=prompt,
+                               scope=self._cache_scope(user_email_context, output_language, personalize_emails))
+            yield dict(email_template, done=True)
+
+        except TimeoutError as e:
+            error = type(e).__name__
+            yield {"subject": "Error", "body": f"AI generation timed out: {e}", "done": True}
+        except json.JSONDecodeError as e:
+            error = type(e).__name__
+            yield {"subject": "Error", "body": f"Failed to parse AI response (JSON error): {e}. Raw: {''.join(chunks)}", "done": True}
+        except ValueError as e:
+            error = type(e).__name__
+            yield {"subject": "Error", "body": f"AI response validation error: {e}. Raw: {''.join(chunks)}", "done": True}
+        except _openai_api_errors() as e:
+            error = type(e).__name__
+            yield {"subject": "Error", "body": f"OpenAI API Error: {e}", "done": True}
+        except Exception as e:
+            error = type(e).__name__
+            yield {"subject": "Error", "body": f"An unexpected error occurred: {e}", "done": True}
+        finally:
+            if stream is not None:
+                stream.close() # Stop receiving tokens if we bailed out early
+            self._record_call("generate_email_template_stream", started, usage=usage, error=error,
+                              first_token_at=first_token_at)
+
+    def generate_language_variants(self, prompt, languages, user_email_context="", personalize_emails=False, force_refresh=False):
+        """
+        Generates the same email in several languages at once from one prompt.
+
+        One generate_email_template call is made per language, all in parallel, so the total
+        wait is about the slowest single generation instead of their sum.
+
+        Returns:
+            dict: {language_code: {'subject': ..., 'body': ...}} in the order of languages.
+        """
+        languages = list(dict.fromkeys(languages)) # Drop duplicates, keep order
+        if not languages:
+            return {}
+        with ThreadPoolExecutor(max_workers=len(languages)) as executor:
+            futures = {
+                language: executor.submit(
+                    self.generate_email_template,
+                    prompt,
+                    user_email_context=user_email_context,
+                    output_language=language,
+                    personalize_emails=personalize_emails,
+                    force_refresh=force_refresh
+                )
+                for language in languages
+            }
+            return {language: future.result() for language, future in futures.items()}
+
+    def _build_personalization_messages(self, subject, body, contact, output_language):
+        """Builds the chat messages asking the model to tailor one rendered email to one contact."""
+        system_message = (
+            "You are an AI assistant that personalizes an existing email for a single recipient. "
+            "Keep the meaning, facts, dates and links of the email unchanged; adapt tone and wording to the recipient details. "
+            "The output MUST be a JSON object with two keys: 'subject' and 'body'. "
+            f"The email must stay in {output_language} language. "
+            "Use '\\n\\n' for new paragraphs in 'body'. Do not add placeholders."
+        )
+        details = {key: value for key, value in contact.items() if value}
+        user_message_content = (
+            f"Recipient details: {json.dumps(details, ensure_ascii=False)}\n"
+            f"Subject: {subject}\n"
+            f"Body:\n{body}"
+        )
+        return [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message_content}
+        ]
+
+    def estimate_cost(self, prompt_tokens, completion_tokens, model=None):
+        """Returns the approximate USD cost of a call, or 0.0 for models without known pricing."""
+        input_price, output_price = MODEL_PRICING.get(model or self.model, (0.0, 0.0))
+        return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+    async def personalize_for_contacts_async(self, subject, body, contacts, output_language="en", concurrency=8,
+                                             max_total_tokens=None, max_cost=None, max_attempts=3, previous_results=None):
+        """
+        Writes a personalized subject and body for every contact, several requests at a time.
+
+        Placeholders are filled first, then the model tailors each email to its recipient.
+        Results come back in the same order as contacts.
+
+        Args:
+            subject (str): Subject template.
+            body (str): Body template.
+            contacts (list): Contact dicts as returned by load_contacts_from_excel.
+            output_language (str): Language of the emails.
+            concurrency (int): Maximum number of requests in flight at once.
+            max_total_tokens (int): Stop starting new requests once this many tokens were used.
+            max_cost (float): Stop starting new requests once this many USD were spent.
+            max_attempts (int): Attempts per contact before it is reported as an error.
+            previous_results (list): Results of an earlier run over the same contacts (one per contact,
+                                     same order). Contacts that already succeeded, with the same
+                                     email, are kept as they are and not requested again.
+
+        Returns:
+            list: One dict per contact with 'index', 'email', 'status' ("success", "error" or
+                  "skipped"), 'subject', 'body', 'error', 'tokens' and 'cost'.
+            Budgets are checked before each request starts, so up to `concurrency` requests
+            already in flight may finish past the limit.
+
+        Raises:
+            ValueError: If previous_results does not have one entry per contact.
+        """
+        if previous_results is not None and len(previous_results) != len(contacts):
+            raise ValueError(f"previous_results has {len(previous_results)} entries for {len(contacts)} contacts.")
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        spent = {"tokens": 0, "cost": 0.0}
+
+        def budget_exhausted():
+            return ((max_total_tokens is not None and spent["tokens"] >= max_total_tokens) or
+                    (max_cost is not None and spent["cost"] >= max_cost))
+
+        async def personalize_one(session, index, contact):
+            previous = previous_results[index] if previous_results else None
+            if (previous and previous.get("status") == "success"
+                    and previous.get("email") == contact.get("email", "")):
+                return previous
+            result = {"index": index, "email": contact.get("email", ""), "status": "error",
+                      "subject": "", "body": "", "error": "", "tokens": 0, "cost": 0.0}
+            messages = self._build_personalization_messages(
+                render_contact(subject, contact), render_contact(body, contact), contact, output_language
+            )
+            async with semaphore:
+                for attempt in range(max_attempts):
+                    if budget_exhausted():
+                        result.update(status="skipped", error="Token or cost budget exhausted.")
+                        return result
+                    call_started = time.perf_counter()
+                    usage = None
+                    try:
+                        content, usage = await session.complete(self.model, messages)
+                        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+                        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+                        cost = self.estimate_cost(prompt_tokens, completion_tokens)
+                        spent["tokens"] += prompt_tokens + completion_tokens
+                        spent["cost"] += cost
+                        result["tokens"] += prompt_tokens + completion_tokens
+                        result["cost"] += cost
+
+                        email = self._parse_email(content) # Keeps the greeting the model wrote for this contact
+                        result.update(status="success", subject=email["subject"], body=email["body"], error="")
+                        self._record_call("personalize_for_contacts", call_started, usage=usage)
+                        return result
+                    except Exception as e:
+                        self._record_call("personalize_for_contacts", call_started, usage=usage, error=type(e).__name__)
+                        result["error"] = f"{type(e).__name__}: {e}"
+                        if attempt + 1 < max_attempts:
+                            await asyncio.sleep(0.5 * 2 ** attempt) # Back off before retrying this contact
+            return result
+
+        async with self.backend.async_session() as session:
+            return await asyncio.gather(*(personalize_one(session, i, contact) for i, contact in enumerate(contacts)))
+
+    def personalize_for_contacts(self, subject, body, contacts, **kwargs):
+        """Blocking wrapper around personalize_for_contacts_async, for the Streamlit and GUI threads."""
+        return asyncio.run(self.personalize_for_contacts_async(subject, body, contacts, **kwargs))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,268 @@
+# email_renderer.py
+import collections
+import hashlib
+import html
+import re
+import threading
+from functools import lru_cache
+from itertools import repeat
+
+# Matches {{Placeholder}} tokens, tolerating spaces inside the braces (e.g. '{{ Date }}')
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*([^{}]+?)\s*\}\}")
+
+# French/English spellings that map onto the two built-in contact fields
+PLACEHOLDER_ALIASES = {
+    "nom": "name",
+    "courriel": "email",
+    "e-mail": "email",
+    "mail": "email",
+}
+
+# Fields that are only filled in when personalization is turned on.
+# When it is off, these placeholders are stripped, as the app has always done.
+PERSONAL_FIELDS = ("name", "email")
+
+# Contact columns that say which language a contact should be written to, and the values understood there
+LANGUAGE_COLUMNS = ("language", "langue", "lang", "langage")
+LANGUAGE_ALIASES = {
+    "en": "en", "english": "en", "anglais": "en", "eng": "en",
+    "fr": "fr", "french": "fr", "français": "fr", "francais": "fr", "fra": "fr",
+}
+
+# Number of distinct bodies whose HTML/plain-text versions are kept in memory
+FORMAT_CACHE_SIZE = 1024
+
+
+def normalize_field(label):
+    """
+    Normalizes a column header or placeholder name into a contact key:
+    lowercase, surrounding whitespace removed, inner whitespace collapsed.
+    """
+    return " ".join(str(label).split()).lower()
+
+
+def _field_key(placeholder_name):
+    key = normalize_field(placeholder_name)
+    return PLACEHOLDER_ALIASES.get(key, key)
+
+
+@lru_cache(maxsize=256)
+def compile_template(text):
+    """
+    Splits a template once into its literal chunks and placeholder fields.
+
+    Returns:
+        tuple: (literals, fields, raw_tokens) where literals has one more item than fields.
+               raw_tokens keeps the original '{{...}}' text of each placeholder.
+    """
+    literals = []
+    fields = []
+    raw_tokens = []
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        literals.append(text[position:match.start()])
+        fields.append(_field_key(match.group(1)))
+        raw_tokens.append(match.group(0))
+        position = match.end()
+    literals.append(text[position:])
+    return tuple(literals), tuple(fields), tuple(raw_tokens)
+
+
+def contact_language(contact, default=None):
+    """Returns the language code from a contact's language column (e.g. 'Français' -> 'fr'), or default."""
+    for column in LANGUAGE_COLUMNS:
+        value = contact.get(column)
+        if value:
+            return LANGUAGE_ALIASES.get(normalize_field(value), default)
+    return default
+
+
+def find_placeholders(text):
+    """Returns the distinct placeholder names used in a template, in order of appearance."""
+    seen = []
+    for match in PLACEHOLDER_PATTERN.finditer(text or ""):
+        name = match.group(1)
+        if name not in seen:
+            seen.append(name)
+    return seen
+
+
+def _field_column(contacts, field, raw_token, personalize, convert=None):
+    """
+    Builds the column of replacement values for one field across all contacts.
+    convert, if given, is applied to the real values (e.g. HTML escaping).
+    """
+    if field in PERSONAL_FIELDS and not personalize:
+        return repeat("", len(contacts))
+    # Unknown or empty values keep the literal placeholder so the pre-send check can catch them
+    if convert is None:
+        return [contact.get(field) or raw_token for contact in contacts]
+    values = (contact.get(field) for contact in contacts)
+    return [convert(value) if value else raw_token for value in values]
+
+
+def text_to_html(text):
+    """Converts a plain-text body to HTML: escapes it and turns each line break into a single <br>."""
+    return html.escape(text or "").replace("\n", "<br>\n")
+
+
+@lru_cache(maxsize=256)
+def compile_html_template(text):
+    """Same as compile_template, but with the literal chunks already converted to HTML."""
+    literals, fields, raw_tokens = compile_template(text)
+    return tuple(text_to_html(literal) for literal in literals), fields, tuple(html.escape(raw) for raw in raw_tokens)
+
+
+def _join_columns(literals, fields, raw_tokens, contacts, personalize, convert=None):
+    count = len(contacts)
+    columns = [repeat(literals[0], count)]
+    for index, field in enumerate(fields):
+        columns.append(_field_column(contacts, field, raw_tokens[index], personalize, convert))
+        columns.append(repeat(literals[index + 1], count))
+    return list(map("".join, zip(*columns)))
+
+
+def render_bulk(text, contacts, personalize=True):
+    """
+    Renders one template for many contacts at once.
+
+    The template is compiled a single time, every placeholder is resolved as a whole
+    column of values, and the rows are then assembled by joining the columns together.
+
+    Args:
+        text (str): Template containing '{{Column}}' placeholders.
+        contacts (list): Contact dicts as returned by load_contacts_from_excel.
+        personalize (bool): If False, name/email placeholders are removed instead of filled.
+
+    Returns:
+        list: One rendered string per contact, in the same order.
+    """
+    text = text or ""
+    literals, fields, raw_tokens = compile_template(text)
+    if not fields:
+        return [text] * len(contacts)
+    return _join_columns(literals, fields, raw_tokens, contacts, personalize)
+
+
+def render_bulk_formats(text, contacts, personalize=True):
+    """
+    Renders a plain-text body template into both plain text and escaped HTML in one stage.
+
+    The template is converted to HTML once; per contact only the substituted values
+    are escaped, so no body is converted twice.
+
+    Returns:
+        tuple: (text_bodies, html_bodies), each a list with one entry per contact.
+    """
+    text = text or ""
+    text_bodies = render_bulk(text, contacts, personalize)
+    literals, fields, raw_tokens = compile_html_template(text)
+    if not fields:
+        return text_bodies, [literals[0]] * len(contacts)
+    html_bodies = _join_columns(literals, fields, raw_tokens, contacts, personalize, convert=text_to_html)
+    return text_bodies, html_bodies
+
+
+_format_cache = collections.OrderedDict()
+_format_cache_lock = threading.Lock()
+
+
+def render_formats(body):
+    """
+    Returns (html_body, text_body) for an already rendered plain-text body.
+
+    Results are cached by content hash, so a body shared by many recipients
+    (e.g. a non-personalized campaign) is only converted once.
+    """
+    body = body or ""
+    key = hashlib.blake2b(body.encode("utf-8"), digest_size=16).digest()
+    with _format_cache_lock:
+        cached = _format_cache.get(key)
+        if cached is not None:
+            _format_cache.move_to_end(key)
+            return cached
+    formats = (text_to_html(body), body)
+    with _format_cache_lock:
+        _format_cache[key] = formats
+        if len(_format_cache) > FORMAT_CACHE_SIZE:
+            _format_cache.popitem(last=False)
+    return formats
+
+
+def render_contact(text, contact, personalize=True):
+    """Renders a template for a single contact."""
+    return render_bulk(text, [contact], personalize)[0]
+
+
+def find_unresolved_placeholders(texts, contacts, personalize=True):
+    """
+    Reports placeholders that would be mailed out literally.
+
+    Args:
+        texts (list): Templates to check (typically the subject and the body).
+        contacts (list): Contact dicts that will receive the email.
+        personalize (bool): Same flag as used for rendering.
+
+    Returns:
+        dict: {placeholder_name: number_of_contacts_without_a_value}. Empty if everything resolves.
+    """
+    unresolved = {}
+    checked = set()
+    for text in texts:
+        for name in find_placeholders(text):
+            field = _field_key(name)
+            if field in checked:
+                continue
+            checked.add(field)
+            if field in PERSONAL_FIELDS and not personalize:
+                continue
+            missing = sum(1 for contact in contacts if not contact.get(field))
+            if missing:
+                unresolved[name] = missing
+    return unresolved
+
+
+def template_hash(text):
+    """Short content hash of a template, used as a memoization key."""
+    return hashlib.blake2b((text or "").encode("utf-8"), digest_size=16).hexdigest()
+
+
+class PreviewRenderer:
+    """
+    Memoized single-contact renderer for the live preview.
+
+    Each field (subject, body) is cached separately under (template hash, contact index,
+    personalize), so editing the body does not re-render the subject and paging back
+    to a contact already seen costs nothing. Entries belong to one contact list: rendering
+    from another list (by identity, e.g. a newly uploaded workbook) starts an empty cache.
+    One renderer may be shared by several sessions previewing the same contact list.
+    """
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._cache = collections.OrderedDict()
+        self._contacts = None # The list the cached entries were rendered from
+        self._lock = threading.Lock()
+
+    def render(self, text, contacts, index, personalize=True):
+        key = (template_hash(text), index, personalize)
+        with self._lock:
+            if contacts is not self._contacts:
+                self._cache.clear()
+                self._contacts = contacts
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+        rendered = render_contact(text, contacts[index], personalize)
+        with self._lock:
+            if contacts is not self._contacts:
+                return rendered # The list changed meanwhile: this entry would be stale
+            self._cache[key] = rendered
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return rendered
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._contacts = None
@@ -1,12 +1,9 @@
 import datetime
 import os
 import base64
-import json
 
-# Import Brevo SDK
-import brevo_python as sib_api_v3_sdk
-from brevo_python.rest import ApiException
-from config import BREVO_API_KEY, FAILED_EMAILS_LOG_PATH  # Import your BREVO_API_KEY and log path constants
+from config import BREVO_API_KEY, BREVO_API_HOST, FAILED_EMAILS_LOG_PATH  # Import your BREVO_API_KEY and log path constants
+from email_renderer import render_formats
 
 
 def _log_failed_email_to_file(sender_email, to_email, subject, body, error_message, log_path=FAILED_EMAILS_LOG_PATH):
@@ -29,29 +26,49 @@ def _log_failed_email_to_file(sender_email, to_email, subject, body, error_messa
 
 
 
+def _brevo_sdk():
+    """
+    Imports the Brevo SDK on first use. It is large and only needed to actually send,
+    so importing this module (and the apps using it) stays fast.
+    """
+    import brevo_python
+    import brevo_python.rest
+    return brevo_python
+
+
+def _message_formats(msg):
+    """Returns (html_body, text_body) for a message dict, rendering the HTML only if it is missing."""
+    body = msg.get('body', '')
+    if msg.get('html_body'):
+        return msg['html_body'], body
+    return render_formats(body)
+
+
 def _build_message_versions(messages):
     """
     Build and return a list of SendSmtpEmailMessageVersions instances
     for bulk batch sends.
 
-    :param messages: List of dicts with keys 'to_email', 'to_name', 'subject', 'body'
+    :param messages: List of dicts with keys 'to_email', 'to_name', 'subject', 'body' (plain text)
+                     and optionally 'html_body' (already rendered, e.g. by send_pipeline.render_batch)
     :return: List of sib_api_v3_sdk.SendSmtpEmailMessageVersions
     """
+    sib_api_v3_sdk = _brevo_sdk()
     versions = []
 
     for i, msg in enumerate(messages):
         to_email = msg['to_email']
         to_name = msg.get('to_name', '')
         subject = msg.get('subject', '')
-        body = msg.get('body', '')
-        html_body = body.replace('\n', '<br>')
+        html_body, text_body = _message_formats(msg)
 
         # Create nested SDK model objects
         to_obj = sib_api_v3_sdk.SendSmtpEmailTo(email=to_email, name=to_name)
         version_obj = sib_api_v3_sdk.SendSmtpEmailMessageVersions(
             to=[to_obj],
             subject=subject,
-            html_content=html_body
+            html_content=html_body,
+            text_content=text_body
         )
         versions.append(version_obj)
 
@@ -60,8 +77,11 @@ def _build_message_versions(messages):
 
 def send_email_message(sender_email, sender_name, to_email, to_name, subject, body, attachments=None):
     """Send a single transactional email."""
+    sib_api_v3_sdk = _brevo_sdk()
     configuration = sib_api_v3_sdk.Configuration()
     configuration.api_key['api-key'] = BREVO_API_KEY
+    if BREVO_API_HOST:
+        configuration.host = BREVO_API_HOST
     api = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(configuration))
 
     # Process attachments
@@ -79,12 +99,13 @@ def send_email_message(sender_email, sender_name, to_email, to_name, subject, bo
             except Exception as e:
                 _log_failed_email_to_file(sender_email, to_email, subject, body, str(e))
 
-    html_body = body.replace('\n', '<br>')
+    html_body, text_body = render_formats(body)
     email_args = {
         'sender': {'email': sender_email, 'name': sender_name},
         'to': [ {'email': to_email, 'name': to_name} ],
         'subject': subject,
         'html_content': html_body,
+        'text_content': text_body,
     }
     if attachment_list:
         email_args['attachment'] = attachment_list
@@ -94,7 +115,7 @@ def send_email_message(sender_email, sender_name, to_email, to_name, subject, bo
     try:
         response = api.send_transac_email(email_model)
         return {'status': 'success', 'response': response}
-    except ApiException as e:
+    except sib_api_v3_sdk.rest.ApiException as e:
         err = e.body if hasattr(e, 'body') else str(e)
         _log_failed_email_to_file(sender_email, to_email, subject, body, err)
         return {'status': 'error', 'message': err}
@@ -108,8 +129,11 @@ def send_bulk_email_messages(sender_email, sender_name, messages, attachments=No
     if len(messages) > 2000:
         return {'status': 'error', 'message': 'Brevo limit is 2000 recipients per batch'}
 
+    sib_api_v3_sdk = _brevo_sdk()
     configuration = sib_api_v3_sdk.Configuration()
     configuration.api_key['api-key'] = BREVO_API_KEY
+    if BREVO_API_HOST:
+        configuration.host = BREVO_API_HOST
     api = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(configuration))
 
     # Process attachments once
@@ -129,13 +153,14 @@ def send_bulk_email_messages(sender_email, sender_name, messages, attachments=No
 
     # Use first message as global default
     first = messages[0]
-    global_html = first.get('body', '').replace('\n', '<br>')
+    global_html, global_text = _message_formats(first)
     global_subject = first.get('subject', '')
 
     batch_args = {
         'sender': {'email': sender_email, 'name': sender_name},
         'subject': global_subject,
         'html_content': global_html,
+        'text_content': global_text,
         'message_versions': versions
     }
     if attachment_list:
@@ -158,7 +183,7 @@ def send_bulk_email_messages(sender_email, sender_name, messages, attachments=No
             'message_ids': message_ids,
             'total_sent': len(message_ids)
         }
-    except ApiException as e:
+    except sib_api_v3_sdk.rest.ApiException as e:
         err = e.body if hasattr(e, 'body') else str(e)
         for msg in messages:
             _log_failed_email_to_file(sender_email, msg['to_email'], msg.get('subject', ''), msg.get('body', ''), err)
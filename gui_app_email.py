@@ -5,15 +5,26 @@ from tkinter import filedialog, messagebox, scrolledtext
 import threading
 import time
 import os
-import datetime
 
 # Import from config.py - Updated to use BREVO_API_KEY and remove SENDER_PASSWORD
-from config import SENDER_EMAIL, OPENAI_API_KEY, FAILED_EMAILS_LOG_PATH, BREVO_API_KEY
+from config import SENDER_EMAIL, OPENAI_API_KEY, FAILED_EMAILS_LOG_PATH, BREVO_API_KEY, AI_BACKEND
 
 # Import your custom modules
 from data_handler import load_contacts_from_excel
-from email_tool import send_email_message
-from email_agent import SmartEmailAgent # Use the unified email_agent
+from email_tool import send_bulk_email_messages
+from email_agent import get_shared_agent # Use the unified email_agent
+from email_renderer import render_contact, find_unresolved_placeholders
+from activity_log import ActivityLog
+from send_worker import start_send_job
+from campaign_control import CampaignCheckpoint, campaign_key
+
+# How often the activity log widget takes the queued lines, and how many lines it keeps
+LOG_DRAIN_INTERVAL_MS = 100
+LOG_WIDGET_MAX_LINES = 5000
+
+# Recipients per Brevo call, and how many calls may be in progress at once while sending
+SEND_BATCH_SIZE = 200
+SEND_WORKERS = 4
 
 class SmartEmailMessengerApp(ctk.CTk):
     def __init__(self):
@@ -28,12 +39,13 @@ class SmartEmailMessengerApp(ctk.CTk):
 
         self.contacts = []
         self.contact_issues = []
+        self.activity = ActivityLog()
         
         # Initialize AI agent if API key is available
         self.agent = None
-        if OPENAI_API_KEY:
+        if OPENAI_API_KEY or AI_BACKEND == "stub":
             try:
-                self.agent = SmartEmailAgent(openai_api_key=OPENAI_API_KEY)
+                self.agent = get_shared_agent(openai_api_key=OPENAI_API_KEY)
             except ValueError as e:
                 self.log(f"Error initializing AI agent: {e}. AI features will be disabled.", "error")
         else:
@@ -42,22 +54,36 @@ class SmartEmailMessengerApp(ctk.CTk):
         self.selected_file_path = ""
         self.email_preview = None
         self.attachments = [] # List to store paths of attachments
+        self.send_job = None # The campaign being sent, for the pause/resume and cancel buttons
 
         self.create_widgets()
         self.log("Application started.")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.after(LOG_DRAIN_INTERVAL_MS, self._drain_log)
 
     def log(self, message, message_type="info"):
-        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        log_entry = f"[{timestamp}] {message}"
-        self.activity_log.insert(ctk.END, log_entry + "\n")
-        self.activity_log.see(ctk.END) # Auto-scroll to the end
-
-        # Also save to a log file
-        log_dir = "logs"
-        os.makedirs(log_dir, exist_ok=True)
-        sending_log_path = os.path.join(log_dir, "sending_log.txt")
-        with open(sending_log_path, "a", encoding="utf-8") as f:
-            f.write(log_entry + "\n")
+        """Queues a line for the activity log; safe to call from any thread."""
+        self.activity.write(message, message_type)
+
+    def _drain_log(self):
+        # Runs on the Tk loop: shows everything logged since the last run in a single insert
+        entries = self.activity.drain()[-LOG_WIDGET_MAX_LINES:]
+        if entries:
+            chunks = []
+            for line, message_type in entries:
+                chunks += [line + "\n", (message_type,)]
+            self.activity_log.configure(state="normal")
+            self.activity_log.insert(ctk.END, *chunks)
+            excess = int(self.activity_log.index("end-1c").split(".")[0]) - LOG_WIDGET_MAX_LINES
+            if excess > 0:
+                self.activity_log.delete("1.0", f"{excess + 1}.0") # Drop the oldest lines (still in the file)
+            self.activity_log.configure(state="disabled")
+            self.activity_log.see(ctk.END) # Auto-scroll to the end
+        self.after(LOG_DRAIN_INTERVAL_MS, self._drain_log)
+
+    def on_close(self):
+        self.activity.close()
+        self.destroy()
 
 
     def create_widgets(self):
@@ -124,10 +150,25 @@ class SmartEmailMessengerApp(ctk.CTk):
         self.send_button = ctk.CTkButton(self, text="Send Emails to All Contacts", command=self.send_emails_thread)
         self.send_button.pack(pady=10, padx=20, fill="x")
 
+        send_control_frame = ctk.CTkFrame(self)
+        send_control_frame.pack(pady=(0, 5), padx=20, fill="x")
+        self.pause_button = ctk.CTkButton(send_control_frame, text="Pause", command=self.toggle_pause_sending, state="disabled")
+        self.pause_button.pack(side="left", padx=(0, 10), expand=True, fill="x")
+        self.cancel_button = ctk.CTkButton(send_control_frame, text="Cancel Sending", command=self.cancel_sending, state="disabled")
+        self.cancel_button.pack(side="left", expand=True, fill="x")
+
+        self.send_progress = ctk.CTkProgressBar(self)
+        self.send_progress.set(0)
+        self.send_progress.pack(pady=(0, 5), padx=20, fill="x")
+        self.send_progress_label = ctk.CTkLabel(self, text="")
+        self.send_progress_label.pack(pady=(0, 5), padx=20, anchor="w")
+
         # --- Activity Log ---
         ctk.CTkLabel(self, text="Activity Log:").pack(pady=(5,0), padx=20, anchor="w")
         self.activity_log = scrolledtext.ScrolledText(self, wrap=ctk.WORD, height=10, bg="#f0f0f0", fg="#333333")
         self.activity_log.pack(pady=(0,10), padx=20, fill="x")
+        self.activity_log.tag_configure("warning", foreground="#b36b00")
+        self.activity_log.tag_configure("error", foreground="#c0392b")
         self.activity_log.configure(state="disabled") # Make it read-only
 
     def toggle_personalization(self):
@@ -189,7 +230,7 @@ class SmartEmailMessengerApp(ctk.CTk):
 
     def _generate_email_preview_task(self):
         if not self.agent:
-            self.after(0, lambda: self.log("AI Email Agent is not initialized. Check API Key configuration.", "error"))
+            self.log("AI Email Agent is not initialized. Check API Key configuration.", "error")
             self.after(0, lambda: self.preview_button.configure(state="normal", text="Generate Email Preview"))
             self.after(0, lambda: self.send_button.configure(state="normal"))
             self.after(0, lambda: self.upload_button.configure(state="normal"))
@@ -202,7 +243,7 @@ class SmartEmailMessengerApp(ctk.CTk):
         personalize = self.personalized_checkbox.get() == 1
 
         if not prompt:
-            self.after(0, lambda: self.log("Please provide a prompt for the email.", "error"))
+            self.log("Please provide a prompt for the email.", "error")
             self.after(0, lambda: self.preview_button.configure(state="normal", text="Generate Email Preview"))
             self.after(0, lambda: self.send_button.configure(state="normal"))
             self.after(0, lambda: self.upload_button.configure(state="normal"))
@@ -210,45 +251,54 @@ class SmartEmailMessengerApp(ctk.CTk):
             self.after(0, lambda: self.toggle_personalization())
             return
 
-        self.after(0, lambda: self.log("Generating email preview for a sample contact. This may take a moment..."))
+        self.log("Generating email preview for a sample contact. This may take a moment...")
 
         sample_contact = {"name": "Recipient Name", "email": "recipient@example.com"}
         if self.contacts:
             sample_contact = self.contacts[0]
-            self.after(0, lambda: self.log(f"Using first contact for preview: {sample_contact.get('name', 'N/A')} ({sample_contact.get('email', 'N/A')})"))
+            self.log(f"Using first contact for preview: {sample_contact.get('name', 'N/A')} ({sample_contact.get('email', 'N/A')})")
         else:
-            self.after(0, lambda: self.log("No contacts uploaded. Generating a generic preview."))
+            self.log("No contacts uploaded. Generating a generic preview.")
 
         try:
-            generated_template = self.agent.generate_email_template(
+            generated_template = None
+            last_refresh = 0.0
+            for partial in self.agent.generate_email_template_stream(
                 prompt,
                 user_email_context=context,
                 output_language="en", # Assuming English for GUI app, or could add language selection
                 personalize_emails=personalize
-            )
+            ):
+                if partial["done"]:
+                    generated_template = partial
+                    break
+                # Show the text as it arrives, redrawing at most ~10 times per second
+                now = time.monotonic()
+                if now - last_refresh >= 0.1:
+                    last_refresh = now
+                    self.after(0, lambda text=partial["subject"]: self._set_subject_text(text))
+                    self.after(0, lambda text=partial["body"]: self._set_body_text(text))
 
             subject = generated_template["subject"]
             body = generated_template["body"]
 
             # Apply personalization/generic greeting for preview
             if personalize:
-                display_name = sample_contact.get("name", "there")
-                display_email = sample_contact.get("email", "your email")
-                subject = subject.replace("{{Name}}", display_name).replace("{{Email}}", display_email)
-                body = body.replace("{{Name}}", display_name).replace("{{Email}}", display_email)
+                subject = render_contact(subject, sample_contact)
+                body = render_contact(body, sample_contact)
             else:
+                subject = render_contact(subject, sample_contact, personalize=False)
+                body = render_contact(body, sample_contact, personalize=False)
                 generic_greeting = self.generic_greeting_entry.get().strip()
                 if generic_greeting:
                     body = generic_greeting + "\n\n" + body
 
-            self.after(0, lambda: self.subject_entry.delete(0, ctk.END))
-            self.after(0, lambda: self.subject_entry.insert(0, subject))
-            self.after(0, lambda: self.body_entry.delete("1.0", ctk.END))
-            self.after(0, lambda: self.body_entry.insert("1.0", body))
-            self.after(0, lambda: self.log("Email preview generated successfully."))
+            self.after(0, lambda: self._set_subject_text(subject))
+            self.after(0, lambda: self._set_body_text(body))
+            self.log("Email preview generated successfully.")
 
         except Exception as e:
-            self.after(0, lambda: self.log(f"Error generating email: {e}", "error"))
+            self.log(f"Error generating email: {e}", "error")
         finally:
             self.after(0, lambda: self.preview_button.configure(state="normal", text="Generate Email Preview"))
             self.after(0, lambda: self.send_button.configure(state="normal"))
@@ -256,6 +306,14 @@ class SmartEmailMessengerApp(ctk.CTk):
             self.after(0, lambda: self.personalized_checkbox.configure(state="normal"))
             self.after(0, lambda: self.toggle_personalization())
 
+    def _set_subject_text(self, text):
+        self.subject_entry.delete(0, ctk.END)
+        self.subject_entry.insert(0, text)
+
+    def _set_body_text(self, text):
+        self.body_entry.delete("1.0", ctk.END)
+        self.body_entry.insert("1.0", text)
+
     def send_emails_thread(self):
         # Disable buttons while sending is in progress
         self.send_button.configure(state="disabled", text="Sending...")
@@ -267,113 +325,151 @@ class SmartEmailMessengerApp(ctk.CTk):
         # Start sending in a separate thread
         threading.Thread(target=self._send_emails_background_task).start()
 
+    def toggle_pause_sending(self):
+        job = self.send_job
+        if job is None:
+            return
+        if job.state == "running":
+            job.pause()
+            self.pause_button.configure(text="Resume")
+            self.log("Sending paused: no new batch is sent until you resume.", "warning")
+        elif job.state == "paused":
+            job.resume()
+            self.pause_button.configure(text="Pause")
+            self.log("Sending resumed.")
+
+    def cancel_sending(self):
+        job = self.send_job
+        if job is not None and job.state in ("running", "paused"):
+            job.cancel()
+            self.pause_button.configure(state="disabled", text="Pause")
+            self.cancel_button.configure(state="disabled")
+            self.log("Cancelling: finishing the batches already sent...", "warning")
+
+    def _reset_send_controls(self):
+        self.send_job = None
+        self.pause_button.configure(state="disabled", text="Pause")
+        self.cancel_button.configure(state="disabled")
+        self.send_button.configure(state="normal", text="Send Emails to All Contacts")
+        self.preview_button.configure(state="normal")
+        self.upload_button.configure(state="normal")
+        self.personalized_checkbox.configure(state="normal")
+        self.toggle_personalization() # Re-enable/disable generic greeting correctly
+
+    def _show_send_progress(self, processed, total, batch_text):
+        # Runs on the Tk loop; everything is passed in, nothing is read from the worker
+        self.send_progress.set(processed / total if total else 1.0)
+        self.send_progress_label.configure(text=f"{processed}/{total} processed. {batch_text}")
+
     def _send_emails_background_task(self):
         if not self.contacts:
-            self.after(0, lambda: self.log("Please upload contacts first.", "error"))
-            self.after(0, lambda: self.send_button.configure(state="normal", text="Send Emails to All Contacts"))
-            self.after(0, lambda: self.preview_button.configure(state="normal"))
-            self.after(0, lambda: self.upload_button.configure(state="normal"))
-            self.after(0, lambda: self.personalized_checkbox.configure(state="normal"))
-            self.after(0, lambda: self.toggle_personalization())
+            self.log("Please upload contacts first.", "error")
+            self.after(0, self._reset_send_controls)
             return
         
         subject = self.subject_entry.get()
         body = self.body_entry.get("1.0", ctk.END).strip()
 
         if not subject or not body:
-            self.after(0, lambda: self.log("Subject and body cannot be empty.", "error"))
-            self.after(0, lambda: self.send_button.configure(state="normal", text="Send Emails to All Contacts"))
-            self.after(0, lambda: self.preview_button.configure(state="normal"))
-            self.after(0, lambda: self.upload_button.configure(state="normal"))
-            self.after(0, lambda: self.personalized_checkbox.configure(state="normal"))
-            self.after(0, lambda: self.toggle_personalization())
+            self.log("Subject and body cannot be empty.", "error")
+            self.after(0, self._reset_send_controls)
             return
         
         if not SENDER_EMAIL:
-            self.after(0, lambda: self.log("Sender email is not configured. Email sending will be disabled.", "error"))
-            self.after(0, lambda: self.send_button.configure(state="normal", text="Send Emails to All Contacts"))
-            self.after(0, lambda: self.preview_button.configure(state="normal"))
-            self.after(0, lambda: self.upload_button.configure(state="normal"))
-            self.after(0, lambda: self.personalized_checkbox.configure(state="normal"))
-            self.after(0, lambda: self.toggle_personalization())
+            self.log("Sender email is not configured. Email sending will be disabled.", "error")
+            self.after(0, self._reset_send_controls)
             return
         
         if not BREVO_API_KEY:
-            self.after(0, lambda: self.log("Brevo API Key is not configured. Email sending will be disabled.", "error"))
-            self.after(0, lambda: self.send_button.configure(state="normal", text="Send Emails to All Contacts"))
-            self.after(0, lambda: self.preview_button.configure(state="normal"))
-            self.after(0, lambda: self.upload_button.configure(state="normal"))
-            self.after(0, lambda: self.personalized_checkbox.configure(state="normal"))
-            self.after(0, lambda: self.toggle_personalization())
+            self.log("Brevo API Key is not configured. Email sending will be disabled.", "error")
+            self.after(0, self._reset_send_controls)
             return
 
-        self.after(0, lambda: self.log("Email sending process initiated..."))
-
-        total_success = 0
-        total_failed = 0 # Includes skipped and actual failures
-
-        sender_email_configured = SENDER_EMAIL
-        # Derive sender_name from SENDER_EMAIL (e.g., "JohnDoe" from "johndoe@example.com")
-        sender_name = sender_email_configured.split('@')[0].replace('.', ' ').title() if sender_email_configured else "Sender"
-
-        for i, recipient in enumerate(self.contacts):
-            recipient_email = recipient.get('email')
-            recipient_name = recipient.get('name', 'there')
+        personalize = self.personalized_checkbox.get() == 1
 
-            self.after(0, lambda: self.log(f"\n--- [{i + 1}/{len(self.contacts)}] Processing contact: {recipient_name} ({recipient_email}) ---"))
+        # Report placeholders that would be mailed out literally instead of sending them
+        unresolved = find_unresolved_placeholders([subject, body], self.contacts, personalize)
+        if unresolved:
+            details = ", ".join(f"{{{{{name}}}}} (missing for {count})" for name, count in unresolved.items())
+            self.log(f"Some placeholders cannot be filled from the contacts file: {details}. Sending cancelled.", "error")
+            self.after(0, self._reset_send_controls)
+            return
 
-            if not recipient_email:
-                total_failed += 1
-                self.after(0, lambda: self.log(f"  - Skipping contact {recipient_name} due to missing email address.", "warning"))
-                continue
+        self.log("Email sending process initiated...")
 
-            final_body = body
-            final_subject = subject
+        # Contacts without an email are skipped by the send engine; report them here
+        skipped = [recipient for recipient in self.contacts if not recipient.get('email')]
+        for recipient in skipped:
+            self.log(f"  - Skipping contact {recipient.get('name', 'there')} due to missing email address.", "warning")
 
-            if self.personalized_checkbox.get() == 1:
-                # Replace placeholders with actual contact data for personalized emails
-                final_body = final_body.replace("{{Name}}", recipient_name).replace("{{Email}}", recipient_email)
-                final_subject = final_subject.replace("{{Name}}", recipient_name).replace("{{Email}}", recipient_email)
-                self.after(0, lambda: self.log(f"  Generating personalized email for {recipient_name}..."))
-            else:
-                generic_greeting = self.generic_greeting_entry.get().strip()
-                if generic_greeting:
-                    final_body = generic_greeting + "\n\n" + final_body
-                self.after(0, lambda: self.log(f"  Preparing generic email for {recipient_name}..."))
+        if not personalize:
+            generic_greeting = self.generic_greeting_entry.get().strip()
+            if generic_greeting:
+                body = generic_greeting + "\n\n" + body
 
+        sender_email_configured = SENDER_EMAIL
+        # Derive sender_name from SENDER_EMAIL (e.g., "JohnDoe" from "johndoe@example.com")
+        sender_name = sender_email_configured.split('@')[0].replace('.', ' ').title() if sender_email_configured else "Sender"
+        attachments = list(self.attachments) or None
 
-            self.after(0, lambda: self.log(f"  Attempting Email for {recipient_name}..."))
+        def send_batch(messages, _attachment_paths):
+            # Attachments are files on this machine already: send them from where they are
             try:
-                result = send_email_message(
-                    sender_email=sender_email_configured,
-                    sender_name=sender_name,
-                    to_email=recipient_email,
-                    to_name=recipient_name,
-                    subject=final_subject,
-                    body=final_body,
-                    attachments=self.attachments
-                )
-                
-                if result['status'] == 'success':
-                    total_success += 1
-                    self.after(0, lambda: self.log(f"    - Email: success - Email sent to {recipient_email} successfully."))
+                return send_bulk_email_messages(sender_email_configured, sender_name, messages, attachments)
+            except Exception as e: # Reported for every recipient of the batch; the next batches still go out
+                return {'status': 'error', 'message': f"An unexpected error occurred: {e}"}
+
+        # Sending the same campaign again after a cancel or crash skips who already received it
+        checkpoint = CampaignCheckpoint(campaign_key(subject, body, personalize, self.contacts, attachments))
+
+        # Rendering, batching and sending run in the send job's thread, SEND_WORKERS batches at a time
+        job = start_send_job(self.contacts, subject, body, personalize, send_batch,
+                             batch_size=SEND_BATCH_SIZE, max_in_flight=SEND_WORKERS + 1, send_workers=SEND_WORKERS,
+                             checkpoint=checkpoint)
+        self.send_job = job
+        self.after(0, lambda: self.pause_button.configure(state="normal"))
+        self.after(0, lambda: self.cancel_button.configure(state="normal"))
+        if job.skipped:
+            self.log(f"{job.skipped} recipient(s) already received this campaign in an earlier, interrupted send and are skipped.")
+        total_batches = -(-job.total // SEND_BATCH_SIZE)
+        self.after(0, self._show_send_progress, 0, job.total, f"Sending in {total_batches} batches...")
+
+        reported = 0 # Recipients already written to the activity log
+        while True:
+            finished = job.wait(timeout=0.2)
+            recipients = job.recipients
+            batch_sent = batch_failed = 0
+            for i in range(reported, job.processed):
+                email, name = recipients["email"][i], recipients["name"][i]
+                if recipients["status"][i] == "sent":
+                    batch_sent += 1
+                    self.log(f"    - Email: success - Email sent to {email} ({name}) successfully.")
                 else:
-                    total_failed += 1
-                    self.after(0, lambda: self.log(f"    - Email: error - Failed to send to {recipient_email}. Details: {result['message']}", "error"))
-            except Exception as e:
-                total_failed += 1
-                self.after(0, lambda: self.log(f"    - Email: error - An unexpected error occurred for {recipient_email}: {e}", "error"))
-                
-            time.sleep(0.1) # Small delay to avoid hammering the API
-
-        self.after(0, lambda: self.log("--- Email sending process complete ---"))
-        self.after(0, lambda: self.log(f"Summary: {total_success} successful, {total_failed} failed/skipped."))
+                    batch_failed += 1
+                    self.log(f"    - Email: error - Failed to send to {email} ({name}). Details: {recipients['error'][i]}", "error")
+                if i + 1 == job.processed or recipients["batch"][i + 1] != recipients["batch"][i]:
+                    batch_text = f"Batch {recipients['batch'][i]}/{total_batches}: {batch_sent} sent, {batch_failed} failed."
+                    self.log(batch_text)
+                    batch_sent = batch_failed = 0
+            if job.processed > reported:
+                self.after(0, self._show_send_progress, job.processed, job.total, f"{batch_text} Total: {job.success} sent.")
+                reported = job.processed
+            if finished:
+                break
+
+        total_success = job.success
+        total_failed = job.processed - job.success + len(skipped) # Includes skipped and actual failures
+        if job.state == "failed":
+            self.log(f"Sending stopped by an unexpected error: {job.error}", "error")
+            total_failed += job.total - job.processed
+        elif job.state == "cancelled":
+            self.log(f"Sending was cancelled: {job.total - job.processed} email(s) were not sent. "
+                     "Send the same email again to resume with them.", "warning")
+
+        self.log("--- Email sending process complete ---")
+        self.log(f"Summary: {total_success} successful, {total_failed} failed/skipped.")
         
-        self.after(0, lambda: self.send_button.configure(state="normal", text="Send Emails to All Contacts"))
-        self.after(0, lambda: self.preview_button.configure(state="normal"))
-        self.after(0, lambda: self.upload_button.configure(state="normal"))
-        self.after(0, lambda: self.personalized_checkbox.configure(state="normal"))
-        self.after(0, lambda: self.toggle_personalization()) # Re-enable/disable generic greeting correctly
+        self.after(0, self._reset_send_controls)
         
         self.after(0, lambda: messagebox.showinfo("Sending Complete", 
                                                   f"Finished sending emails.\nSuccessful: {total_success}\nFailed/Skipped: {total_failed}\n\nCheck the Activity Log for details."))
@@ -0,0 +1,165 @@
+# json_stream.py
+
+_SIMPLE_ESCAPES = {
+    '"': '"', '\\': '\\', '/': '/',
+    'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t',
+}
+
+
+class IncrementalJSONObjectParser:
+    """
+    Incremental parser for a streamed JSON object such as {"subject": "...", "body": "..."}.
+
+    Chunks of text are fed as they arrive. Top-level string values are decoded on the fly
+    and exposed through `values`, including the one currently being received, so a UI can
+    show partial text. Structural problems (e.g. the answer not starting with '{') raise
+    ValueError as soon as the offending character is seen, not after the whole completion.
+    Nested objects/arrays and non-string values are checked for balance but not decoded.
+    """
+    def __init__(self):
+        self.values = {}
+        self.complete = False
+        self._state = "start"    # start, key, colon, value, scalar, nested, comma, done
+        self._in_string = False  # Inside a top-level key or string value
+        self._escape = None      # None, "" (after a backslash) or the hex digits of a \\u escape
+        self._buffer = []
+        self._key = None
+        self._nested_depth = 0
+        self._nested_in_string = False
+        self._nested_escape = False
+        self._position = 0
+
+    def _error(self, char):
+        raise ValueError(f"Unexpected character {char!r} at position {self._position} in JSON stream.")
+
+    def feed(self, chunk):
+        """Consumes the next piece of text. Returns the current (partial) values."""
+        for char in chunk:
+            self._consume(char)
+            self._position += 1
+        return self.values
+
+    def _consume(self, char):
+        if self._in_string:
+            self._consume_string(char)
+            return
+        state = self._state
+        if state == "nested":
+            self._consume_nested(char)
+            return
+        if state == "scalar":
+            if char in ",}":
+                self._state = "value_end"
+                state = "value_end"
+            elif char.isspace() or char.isalnum() or char in "+-.":
+                return
+            else:
+                self._error(char)
+        if char.isspace():
+            return
+        if state == "start":
+            if char != "{":
+                self._error(char)
+            self._state = "key"
+        elif state == "key":
+            if char == '"':
+                self._start_string()
+            elif char == "}" and not self.values and self._key is None:
+                self._finish()
+            else:
+                self._error(char)
+        elif state == "colon":
+            if char != ":":
+                self._error(char)
+            self._state = "value"
+        elif state == "value":
+            if char == '"':
+                self.values[self._key] = ""
+                self._start_string()
+            elif char in "{[":
+                self._state = "nested"
+                self._nested_depth = 1
+            elif char.isalnum() or char == "-":
+                self._state = "scalar"
+            else:
+                self._error(char)
+        elif state in ("comma", "value_end"):
+            if char == ",":
+                self._state = "key"
+                self._key = None
+            elif char == "}":
+                self._finish()
+            else:
+                self._error(char)
+        elif state == "done":
+            self._error(char)
+
+    def _start_string(self):
+        self._in_string = True
+        self._buffer = []
+
+    def _consume_string(self, char):
+        if self._escape is not None:
+            if self._escape == "":
+                if char == "u":
+                    self._escape = "u"
+                    return
+                if char not in _SIMPLE_ESCAPES:
+                    self._error(char)
+                self._append(_SIMPLE_ESCAPES[char])
+                self._escape = None
+                return
+            # Collecting the 4 hex digits of a \\uXXXX escape
+            self._escape += char
+            if len(self._escape) == 5:
+                try:
+                    self._append(chr(int(self._escape[1:], 16)))
+                except ValueError:
+                    self._error(char)
+                self._escape = None
+            return
+        if char == "\\":
+            self._escape = ""
+        elif char == '"':
+            self._in_string = False
+            if self._state == "key":
+                self._key = "".join(self._buffer)
+                self._state = "colon"
+            else:
+                self._fix_surrogates()
+                self._state = "comma"
+        else:
+            self._append(char)
+
+    def _append(self, text):
+        self._buffer.append(text)
+        if self._state == "value":
+            self.values[self._key] += text
+
+    def _fix_surrogates(self):
+        # \\ud83d\\ude00 style pairs arrive as two separate escapes; merge them once the string is closed
+        value = self.values.get(self._key, "")
+        if any("\ud800" <= c <= "\udfff" for c in value):
+            self.values[self._key] = value.encode("utf-16", "surrogatepass").decode("utf-16")
+
+    def _consume_nested(self, char):
+        if self._nested_in_string:
+            if self._nested_escape:
+                self._nested_escape = False
+            elif char == "\\":
+                self._nested_escape = True
+            elif char == '"':
+                self._nested_in_string = False
+            return
+        if char == '"':
+            self._nested_in_string = True
+        elif char in "{[":
+            self._nested_depth += 1
+        elif char in "}]":
+            self._nested_depth -= 1
+            if self._nested_depth == 0:
+                self._state = "comma"
+
+    def _finish(self):
+        self._state = "done"
+        self.complete = True
@@ -0,0 +1,158 @@
+# llm_backends.py
+import abc
+import asyncio
+import collections
+import contextlib
+import hashlib
+import json
+import time
+
+# Token counts of one call, as reported by (or estimated for) a backend
+Usage = collections.namedtuple("Usage", ["prompt_tokens", "completion_tokens"])
+
+
+class LLMBackend(abc.ABC):
+    """
+    What SmartEmailAgent needs from a language model: JSON chat completions, whole or streamed.
+
+    complete() returns (content, usage). stream() yields (text, usage) pairs, usage being None
+    except possibly on the last pair; closing the generator stops the request. async_session()
+    is an async context manager giving an object with an async complete(model, messages).
+    """
+    name = "base"
+
+    @abc.abstractmethod
+    def complete(self, model, messages, timeout=None):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def stream(self, model, messages, timeout=None):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def async_session(self):
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    """Backend calling the OpenAI chat completions API through a (shared) openai.OpenAI client."""
+    name = "openai"
+
+    def __init__(self, client):
+        self.client = client
+
+    def complete(self, model, messages, timeout=None):
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format={"type": "json_object"},
+            timeout=timeout
+        )
+        return response.choices[0].message.content, getattr(response, "usage", None)
+
+    def stream(self, model, messages, timeout=None):
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format={"type": "json_object"},
+            stream=True,
+            stream_options={"include_usage": True}, # Token counts arrive in a final chunk
+            timeout=timeout
+        )
+        try:
+            for event in stream:
+                text = event.choices[0].delta.content if event.choices else None
+                usage = getattr(event, "usage", None)
+                if text or usage:
+                    yield text or "", usage
+        finally:
+            if hasattr(stream, "close"):
+                stream.close() # Stop receiving tokens if the caller bailed out early
+
+    @contextlib.asynccontextmanager
+    async def async_session(self):
+        import openai # Only needed here; the stub backend works without the openai package
+        # An async client is bound to one event loop, so each asyncio.run gets its own
+        async with openai.AsyncOpenAI(api_key=self.client.api_key, base_url=self.client.base_url) as client:
+            yield _AsyncOpenAISession(client)
+
+
+class _AsyncOpenAISession:
+    def __init__(self, client):
+        self.client = client
+
+    async def complete(self, model, messages):
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format={"type": "json_object"}
+        )
+        return response.choices[0].message.content, getattr(response, "usage", None)
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4) # Roughly 4 characters per token for English/French text
+
+
+class StubBackend(LLMBackend):
+    """
+    Offline backend for benchmarks and load tests: no network, no API key.
+
+    Answers are deterministic (derived from the model and the messages), valid JSON with
+    'subject' and 'body', and include {{Email}} when placeholders are asked for. Each call
+    takes `latency` seconds; streamed answers send the first chunk after first_token_latency
+    and spread the rest over the remaining time.
+    """
+    name = "stub"
+
+    def __init__(self, latency=0.5, first_token_latency=None, chunk_size=8):
+        self.latency = latency
+        self.first_token_latency = latency / 4 if first_token_latency is None else first_token_latency
+        self.chunk_size = max(1, chunk_size)
+        self.calls = 0
+
+    def answer(self, model, messages):
+        """Returns (content, usage) for a request, without waiting."""
+        request = json.dumps([model, messages], ensure_ascii=False, sort_keys=True)
+        digest = hashlib.sha256(request.encode("utf-8")).hexdigest()[:8]
+        user_message = messages[-1]["content"]
+        body = f"This is test email {digest}.\n\n{user_message}"
+        if "INCLUDE specific name and email placeholders" in messages[0]["content"]:
+            body += "\n\nWe will keep you informed at {{Email}}."
+        content = json.dumps({"subject": f"Test email {digest}", "body": body}, ensure_ascii=False)
+        prompt_tokens = sum(_estimate_tokens(message["content"]) for message in messages)
+        return content, Usage(prompt_tokens, _estimate_tokens(content))
+
+    def complete(self, model, messages, timeout=None):
+        self.calls += 1
+        if timeout is not None and timeout < self.latency:
+            time.sleep(timeout)
+            raise TimeoutError(f"Stub backend answers after {self.latency} seconds.")
+        time.sleep(self.latency)
+        return self.answer(model, messages)
+
+    def stream(self, model, messages, timeout=None):
+        self.calls += 1
+        content, usage = self.answer(model, messages)
+        chunks = [content[i:i + self.chunk_size] for i in range(0, len(content), self.chunk_size)]
+        time.sleep(self.first_token_latency)
+        pause = max(0.0, self.latency - self.first_token_latency) / len(chunks)
+        for position, chunk in enumerate(chunks):
+            if position:
+                time.sleep(pause)
+            yield chunk, None
+        yield "", usage
+
+    @contextlib.asynccontextmanager
+    async def async_session(self):
+        yield _AsyncStubSession(self)
+
+
+class _AsyncStubSession:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def complete(self, model, messages):
+        self.backend.calls += 1
+        await asyncio.sleep(self.backend.latency)
+        return self.backend.answer(model, messages)
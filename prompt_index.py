@@ -0,0 +1,147 @@
+# prompt_index.py
+import hashlib
+import re
+import threading
+from array import array
+
+# Words that do not change what an email is about; dropped before comparing prompts
+STOP_WORDS = frozenset((
+    "a", "an", "the", "to", "of", "for", "and", "or", "in", "on", "at", "with", "about", "our", "my", "your",
+    "please", "is", "are", "be", "this", "that", "it", "we", "us", "me",
+    "le", "la", "les", "un", "une", "des", "de", "du", "d", "l", "et", "ou", "pour", "au", "aux", "en",
+    "sur", "avec", "notre", "nos", "votre", "vos", "mon", "ma", "mes", "ce", "cette", "est", "sont", "nous",
+))
+
+# Words are cut to this many characters, a crude stemmer: 'invite'/'invitation' -> 'invit'
+STEM_LENGTH = 5
+
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def prompt_shingles(prompt):
+    """
+    Turns a prompt into the set of features compared between prompts: its stemmed
+    content words and each pair of consecutive ones.
+    """
+    words = [word[:STEM_LENGTH] for word in _WORD_PATTERN.findall((prompt or "").lower()) if word not in STOP_WORDS]
+    shingles = set(words)
+    shingles.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+    return shingles
+
+
+def _shingle_hash(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+class MinHasher:
+    """Computes fixed-size MinHash signatures; similar sets get signatures that agree in many positions."""
+    def __init__(self, num_perm=64, seed=1):
+        self.num_perm = num_perm
+        # Universal hash family (a * x + b) mod p, one (a, b) pair per permutation
+        rng = hashlib.blake2b(str(seed).encode("utf-8"), digest_size=64)
+        self._params = []
+        for i in range(num_perm):
+            rng.update(i.to_bytes(4, "little"))
+            digest = rng.digest()
+            a = int.from_bytes(digest[:8], "little") % (_MERSENNE_PRIME - 1) + 1
+            b = int.from_bytes(digest[8:16], "little") % _MERSENNE_PRIME
+            self._params.append((a, b))
+
+    def signature(self, shingles):
+        """Returns the signature as an array of unsigned 32-bit ints (all max values for an empty set)."""
+        hashes = [_shingle_hash(shingle) for shingle in shingles]
+        if not hashes:
+            return array("I", [_MAX_HASH] * self.num_perm)
+        return array("I", [
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes) & _MAX_HASH
+            for a, b in self._params
+        ])
+
+
+def signature_similarity(first, second):
+    """Estimated Jaccard similarity of the two sets behind two signatures (share of equal positions)."""
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+class PromptIndex:
+    """
+    Locality-sensitive hashing index of past prompts, to find near-duplicates quickly.
+
+    Each signature is cut into bands; two prompts become candidates when one whole band
+    matches, so a lookup only compares against a handful of entries instead of all of
+    them. Entries are grouped by scope (model, language, context...), and a lookup only
+    returns prompts from the same scope.
+    """
+    def __init__(self, num_perm=64, bands=16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands.")
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets = {}   # (scope, band number, band values) -> set of keys
+        self._entries = {}   # key -> (scope, signature, prompt)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def signature(self, prompt):
+        return self.hasher.signature(prompt_shingles(prompt))
+
+    def _band_keys(self, scope, signature):
+        rows = self.rows
+        return [(scope, band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+
+    def add(self, key, prompt, scope=None, signature=None):
+        """Indexes a prompt under key (replacing any previous entry with that key)."""
+        if signature is None:
+            signature = self.signature(prompt)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (scope, signature, prompt)
+            for band_key in self._band_keys(scope, signature):
+                self._buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band_key in self._band_keys(entry[0], entry[1]):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def query(self, prompt, scope=None, threshold=0.8, limit=1):
+        """
+        Returns up to limit (key, prompt, similarity) tuples of indexed prompts in the same
+        scope whose estimated similarity is at least threshold, most similar first.
+        """
+        shingles = prompt_shingles(prompt)
+        if not shingles:
+            return [] # Nothing but stop words: any match would be meaningless
+        signature = self.hasher.signature(shingles)
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(scope, signature):
+                candidates.update(self._buckets.get(band_key, ()))
+            matches = []
+            for key in candidates:
+                _, other_signature, other_prompt = self._entries[key]
+                similarity = signature_similarity(signature, other_signature)
+                if similarity >= threshold:
+                    matches.append((key, other_prompt, similarity))
+        matches.sort(key=lambda match: match[2], reverse=True)
+        return matches[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._entries.clear()
@@ -0,0 +1,120 @@
+# send_pipeline.py
+import collections
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+from email_renderer import render_bulk, render_bulk_formats, contact_language
+
+# Recipients rendered and sent together. Brevo accepts up to 2000 per call,
+# smaller batches give earlier first sends and a lower memory ceiling.
+DEFAULT_BATCH_SIZE = 500
+
+# How many rendered batches may be queued for / in the send stage at once.
+# Rendering pauses when this many are waiting, so memory stays at a few batches.
+DEFAULT_MAX_IN_FLIGHT = 2
+
+
+def iter_batches(items, batch_size=DEFAULT_BATCH_SIZE):
+    """Groups any iterable into lists of at most batch_size items, lazily."""
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def render_batch(contacts, subject, body, personalize=True):
+    """
+    Renders subject and body for one batch of contacts.
+
+    Returns:
+        list: Message dicts with 'to_email', 'to_name', 'subject', 'body' (plain text)
+              and 'html_body' keys, as expected by email_tool.send_bulk_email_messages.
+    """
+    subjects = render_bulk(subject, contacts, personalize)
+    text_bodies, html_bodies = render_bulk_formats(body, contacts, personalize)
+    return [
+        {
+            "to_email": contact['email'],
+            "to_name": contact.get('name', ''),
+            "subject": subj,
+            "body": text,
+            "html_body": html_body,
+        }
+        for contact, subj, text, html_body in zip(contacts, subjects, text_bodies, html_bodies)
+    ]
+
+
+def render_batch_variants(contacts, variants, default_language, personalize=True):
+    """
+    Renders a batch where each contact gets the template variant of its own language.
+
+    Args:
+        variants (dict): {language_code: {'subject': ..., 'body': ...}}.
+        default_language (str): Variant used for contacts with no or an unknown language.
+
+    Returns:
+        list: Message dicts in the same order as contacts.
+    """
+    groups = {}
+    for position, contact in enumerate(contacts):
+        language = contact_language(contact, default_language)
+        if language not in variants:
+            language = default_language
+        groups.setdefault(language, []).append(position)
+
+    messages = [None] * len(contacts)
+    for language, positions in groups.items():
+        variant = variants[language]
+        rendered = render_batch([contacts[p] for p in positions], variant['subject'], variant['body'], personalize)
+        for position, message in zip(positions, rendered):
+            messages[position] = message
+    return messages
+
+
+def iter_rendered_batches(contacts, subject, body, personalize=True, batch_size=DEFAULT_BATCH_SIZE,
+                          variants=None, default_language=None):
+    """
+    Load -> render -> batch stage: yields rendered message batches one at a time.
+    Contacts without an email address are skipped.
+
+    If language variants are given, each contact is routed to the variant matching its
+    language column; subject/body are only used when variants is empty.
+    """
+    recipients = (contact for contact in contacts if contact.get('email'))
+    for batch in iter_batches(recipients, batch_size):
+        if variants:
+            yield render_batch_variants(batch, variants, default_language, personalize)
+        else:
+            yield render_batch(batch, subject, body, personalize)
+
+
+def run_send_pipeline(message_batches, send_batch, max_in_flight=DEFAULT_MAX_IN_FLIGHT, send_workers=1):
+    """
+    Send stage: hands each batch to a background sender while the next batch is rendered.
+
+    message_batches is consumed lazily, so with a generator such as iter_rendered_batches
+    batch N+1 renders while batch N is in flight. No new batch is pulled while
+    max_in_flight batches are still waiting to be sent (backpressure).
+
+    Args:
+        message_batches (iterable): Lists of message dicts.
+        send_batch (callable): Called with one list of messages, returns the send result dict.
+        max_in_flight (int): Maximum number of batches submitted but not yet reported.
+        send_workers (int): Number of batches that may be sent concurrently.
+
+    Yields:
+        tuple: (messages, result) for each batch, in the original order.
+    """
+    max_in_flight = max(1, max_in_flight)
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=max(1, send_workers)) as executor:
+        for messages in message_batches:
+            pending.append((messages, executor.submit(send_batch, messages)))
+            while len(pending) >= max_in_flight:
+                done_messages, future = pending.popleft()
+                yield done_messages, future.result()
+        while pending:
+            done_messages, future = pending.popleft()
+            yield done_messages, future.result()
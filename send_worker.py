@@ -0,0 +1,219 @@
+# send_worker.py
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+
+from campaign_control import CampaignControl
+from send_pipeline import DEFAULT_BATCH_SIZE, DEFAULT_MAX_IN_FLIGHT, iter_rendered_batches, run_send_pipeline
+
+# Jobs are kept in this process-wide registry, not in a Streamlit session, so a send keeps
+# running through page reruns and browser disconnects; the page only remembers the job id.
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+# Finished jobs are forgotten after this many seconds
+FINISHED_JOB_RETENTION_SECONDS = 24 * 3600
+
+# Per-recipient result columns; status is "sent" or "failed"
+RESULT_COLUMNS = ("email", "name", "status", "message_id", "error", "batch")
+
+
+class SendJob:
+    """
+    One campaign being sent by a background thread.
+
+    The worker pushes one event per sent batch onto a queue; poll() drains it and folds
+    the events into the counters below, so the page reads a consistent snapshot.
+    State is "running", "paused", "cancelling", "cancelled", "completed" or "failed".
+    Pausing and cancelling act between batches (see campaign_control.CampaignControl).
+    `skipped` counts the recipients left out because the campaign checkpoint has them as sent.
+
+    Per-recipient outcomes are kept column by column in `recipients` (see RESULT_COLUMNS),
+    ready to become a DataFrame without building one dict per recipient.
+    """
+    def __init__(self, total, skipped=0):
+        self.id = uuid.uuid4().hex
+        self.total = total
+        self.skipped = skipped
+        self.state = "running"
+        self.processed = 0
+        self.success = 0
+        self.batch_results = []
+        self.failure_lines = []
+        self.recipients = {column: [] for column in RESULT_COLUMNS}
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._events = queue.Queue()
+        self.control = CampaignControl()
+        self._poll_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def done(self):
+        return self.state in ("cancelled", "completed", "failed")
+
+    @property
+    def progress(self):
+        """Share of contacts processed so far, between 0 and 1."""
+        return min(self.processed / self.total, 1.0) if self.total else 1.0
+
+    def pause(self):
+        """Holds the next batches back; the batches already handed to the email service still finish."""
+        if self.state == "running":
+            self.control.pause()
+            self.state = "paused"
+
+    def resume(self):
+        if self.state == "paused":
+            self.control.resume()
+            self.state = "running"
+
+    def cancel(self):
+        """Stops after the batches already handed to the email service; nothing else is sent."""
+        self.control.cancel()
+        if self.state in ("running", "paused"):
+            self.state = "cancelling"
+
+    def poll(self):
+        """Applies the progress events received since the last call. Returns how many there were."""
+        count = 0
+        with self._poll_lock: # Overlapping page runs may poll the same job
+            while True:
+                try:
+                    event = self._events.get_nowait()
+                except queue.Empty:
+                    return count
+                count += 1
+                kind = event[0]
+                if kind == "batch":
+                    self._apply_batch(event[1], event[2])
+                elif kind == "finished":
+                    self.state = event[1]
+                    self.error = event[2]
+
+    def _apply_batch(self, messages, result):
+        batch_number = len(self.batch_results) + 1
+        count = len(messages)
+        if result.get("status") == "success":
+            self.success += result.get("total_sent", count)
+            message_ids = list(result.get("message_ids", []))
+            statuses = ["sent"] * count
+            message_ids += [""] * (count - len(message_ids))
+            errors = [""] * count
+        else:
+            self.failure_lines.append(f"❌ Bulk send failed: {result.get('message', '')}")
+            statuses = ["failed"] * count
+            message_ids = [""] * count
+            errors = [result.get("message", "")] * count
+        recipients = self.recipients
+        recipients["email"].extend(message["to_email"] for message in messages)
+        recipients["name"].extend(message["to_name"] for message in messages)
+        recipients["status"].extend(statuses)
+        recipients["message_id"].extend(message_ids[:count])
+        recipients["error"].extend(errors)
+        recipients["batch"].extend([batch_number] * count)
+        self.processed += count
+        self.batch_results.append(result)
+
+    def wait(self, timeout=None):
+        """Blocks until the worker thread has ended (for scripts and benchmarks), then polls."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.poll()
+        return self.done
+
+    def _run(self, contacts, subject, body, personalize, send_batch, variants, default_language,
+             attachments, batch_size, max_in_flight, send_workers, checkpoint):
+        state, error = "completed", None
+        all_sent = True
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                # Attachments are written by the worker so they outlive the page run that started it
+                attachment_paths = []
+                for name, data in attachments:
+                    path = os.path.join(temp_dir, name)
+                    with open(path, "wb") as f:
+                        f.write(data)
+                    attachment_paths.append(path)
+
+                rendered = iter_rendered_batches(
+                    contacts, subject, body, personalize, batch_size=batch_size,
+                    variants=variants, default_language=default_language
+                )
+                # No new batch is rendered while paused or once cancellation is requested
+                for messages, result in run_send_pipeline(
+                    self.control.gate(rendered),
+                    lambda messages: send_batch(messages, attachment_paths or None),
+                    max_in_flight=max_in_flight,
+                    send_workers=send_workers
+                ):
+                    # Only the recipients are kept, not the rendered bodies
+                    recipients = [{"to_email": m["to_email"], "to_name": m.get("to_name", "")} for m in messages]
+                    if result.get("status") == "success":
+                        if checkpoint is not None:
+                            checkpoint.mark_done(m["to_email"] for m in recipients)
+                    else:
+                        all_sent = False
+                    self._events.put(("batch", recipients, result))
+            if self.control.cancelled:
+                state = "cancelled"
+            elif checkpoint is not None and all_sent:
+                checkpoint.discard() # Campaign complete: sending it again is a new campaign
+        except Exception as e:
+            state, error = "failed", f"{type(e).__name__}: {e}"
+        self.finished_at = time.time()
+        self._events.put(("finished", state, error))
+
+
+def start_send_job(contacts, subject, body, personalize, send_batch, variants=None, default_language=None,
+                   attachments=(), batch_size=DEFAULT_BATCH_SIZE, max_in_flight=DEFAULT_MAX_IN_FLIGHT, send_workers=1,
+                   checkpoint=None):
+    """
+    Starts sending a campaign in a background thread and returns its SendJob right away.
+
+    Args:
+        contacts (list): Contact dicts; the list is copied, later edits do not affect the send.
+        send_batch (callable): Called as send_batch(messages, attachment_paths_or_None), returns
+                               the result dict of email_tool.send_bulk_email_messages.
+        attachments (list): (file_name, bytes) pairs to attach to every email.
+        send_workers (int): Batches sent concurrently (see send_pipeline.run_send_pipeline).
+        checkpoint (CampaignCheckpoint): If given, recipients it has as sent are skipped (before
+                                         rendering) and every sent batch is recorded in it.
+
+    Returns:
+        SendJob: Also retrievable later with get_send_job(job.id).
+    """
+    total = sum(1 for contact in contacts if contact.get('email'))
+    if checkpoint is not None and len(checkpoint):
+        contacts = checkpoint.remaining(contacts)
+    remaining = sum(1 for contact in contacts if contact.get('email'))
+    job = SendJob(total=remaining, skipped=total - remaining)
+    job._thread = threading.Thread(
+        target=job._run,
+        args=(list(contacts), subject, body, personalize, send_batch, variants, default_language,
+              list(attachments), batch_size, max_in_flight, send_workers, checkpoint),
+        name=f"send-job-{job.id[:8]}",
+        daemon=True
+    )
+    with _jobs_lock:
+        _forget_old_jobs()
+        _jobs[job.id] = job
+    job._thread.start()
+    return job
+
+
+def get_send_job(job_id):
+    """Returns the job with this id, or None if unknown (or forgotten)."""
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def _forget_old_jobs():
+    now = time.time()
+    for job_id, job in list(_jobs.items()):
+        if job.finished_at is not None and now - job.finished_at > FINISHED_JOB_RETENTION_SECONDS:
+            del _jobs[job_id]
@@ -0,0 +1,274 @@
+# session_resources.py
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from config import SESSION_MEMORY_BUDGET_BYTES, SESSION_IDLE_TIMEOUT_SECONDS, SESSION_SPILL_DIR
+from shared_store import SharedContactSet, get_shared_store
+
+
+class BlobStore:
+    """
+    Content-addressed files on disk, named by the SHA-256 of their bytes.
+
+    Identical content is stored once; every put() takes a reference and the file is
+    deleted when release() drops the last one.
+    """
+    def __init__(self, root=SESSION_SPILL_DIR):
+        self.root = root
+        self._refs = {}
+        self._lock = threading.Lock()
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data):
+        """Stores bytes (if not already there) and returns their digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if self._refs.get(digest, 0) == 0:
+                path = self.path(digest)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(data)
+            self._refs[digest] = self._refs.get(digest, 0) + 1
+        return digest
+
+    def read(self, digest):
+        with open(self.path(digest), "rb") as f:
+            return f.read()
+
+    def release(self, digest):
+        with self._lock:
+            count = self._refs.get(digest, 0) - 1
+            if count > 0:
+                self._refs[digest] = count
+                return
+            self._refs.pop(digest, None)
+            try:
+                os.remove(self.path(digest))
+            except FileNotFoundError:
+                pass
+
+
+def estimate_contacts_size(contacts):
+    """Rough memory footprint in bytes of a list of contact dicts (strings plus per-dict overhead)."""
+    return sum(
+        232 + sum(len(str(key)) + len(str(value)) + 100 for key, value in contact.items())
+        for contact in contacts
+    )
+
+
+class Attachment:
+    """An uploaded attachment, held in memory or spilled to the blob store."""
+    def __init__(self, name, data, store):
+        self.name = name
+        self.size = len(data)
+        self._data = data
+        self._digest = None
+        self._store = store
+
+    @property
+    def spilled(self):
+        return self._data is None
+
+    def read(self):
+        return self._data if self._data is not None else self._store.read(self._digest)
+
+
+class SessionResources:
+    """
+    Large per-session data (contacts, attachments) kept under a memory budget.
+
+    Whenever the attachments held in memory exceed budget_bytes, the largest are written
+    to the content-addressed blob store and dropped from memory; they are read back on use.
+    Values taken from the process-wide shared store (e.g. a workbook several sessions
+    uploaded) are held by reference in named slots and are not counted against the budget:
+    one copy serves every session using them. A contact set larger than the budget is
+    itself shared from the blob store rather than from memory.
+    release() frees everything, memory and disk, and lets go of the shared values.
+    """
+    def __init__(self, store, budget_bytes=SESSION_MEMORY_BUDGET_BYTES, shared_store=None):
+        self.id = uuid.uuid4().hex
+        self.store = store
+        self.shared_store = shared_store or get_shared_store()
+        self._shared = {} # slot -> (key, value) held in the shared store
+        self.budget_bytes = budget_bytes
+        self.attachments = []
+        self.released = False
+        self.last_used = time.time()
+        self._contacts = ()
+        self._contacts_size = 0
+        self._contacts_digest = None # Blob holding the contacts when the shared set is spilled
+        self._lock = threading.Lock()
+
+    def touch(self):
+        self.last_used = time.time()
+
+    # --- Shared values ---
+    def use_shared(self, slot, key, loader, on_evict=None):
+        """
+        Returns the shared value for key, loading it only if no session holds it yet.
+        The slot keeps one reference; putting another key in the slot releases the previous one.
+        on_evict(value) runs when no session holds the value any more.
+        """
+        with self._lock:
+            current = self._shared.get(slot)
+            if current is not None and current[0] == key:
+                return current[1]
+        value = self.shared_store.acquire(key, loader, on_evict) # Outside the lock: loading may take a while
+        with self._lock:
+            previous = self._shared.get(slot)
+            self._shared[slot] = (key, value)
+        if previous is not None:
+            self.shared_store.release(previous[0])
+        return value
+
+    def _release_shared(self, slot):
+        previous = self._shared.pop(slot, None)
+        if previous is not None:
+            self.shared_store.release(previous[0])
+
+    # --- Contacts ---
+    def set_shared_contacts(self, key, loader):
+        """
+        Uses the process-wide copy of a parsed contact set instead of an own copy.
+        loader returns a shared_store.SharedContactSet and only runs if no session holds key;
+        a set larger than the budget is then moved to the blob store (see contacts()).
+        """
+        contact_set = self.use_shared("contacts", key, lambda: self._spill_if_large(loader()),
+                                      on_evict=self._release_spilled)
+        with self._lock:
+            shared = self._shared.pop("contacts") # Keep the new reference across the reset
+            self._drop_contacts()
+            self._shared["contacts"] = shared
+            self._contacts = contact_set.contacts
+            self._contacts_size = contact_set.size
+            self._contacts_digest = contact_set.digest
+        return contact_set
+
+    def _spill_if_large(self, contact_set):
+        if contact_set.size <= self.budget_bytes:
+            return contact_set
+        data = json.dumps([dict(contact) for contact in contact_set.contacts], ensure_ascii=False).encode("utf-8")
+        return SharedContactSet(None, contact_set.issues, contact_set.size, self.store.put(data))
+
+    def _release_spilled(self, contact_set):
+        if contact_set.digest is not None:
+            self.store.release(contact_set.digest)
+
+    @property
+    def contacts_key(self):
+        """Shared store key of the current contact set, or None if no contacts were loaded."""
+        shared = self._shared.get("contacts")
+        return shared[0] if shared is not None else None
+
+    def contacts(self):
+        """Returns the (shared) contact list, read back from disk if the set was spilled."""
+        with self._lock:
+            if self._contacts is not None:
+                return self._contacts
+            digest = self._contacts_digest
+        return json.loads(self.store.read(digest).decode("utf-8"))
+
+    def _drop_contacts(self):
+        self._release_shared("contacts")
+        self._contacts, self._contacts_size, self._contacts_digest = (), 0, None
+
+    # --- Attachments ---
+    def add_attachment(self, name, data):
+        """Adds an attachment (replacing one with the same name) and returns it."""
+        attachment = Attachment(name, data, self.store)
+        with self._lock:
+            self._remove_attachment(name)
+            self.attachments.append(attachment)
+            self._enforce_budget()
+        return attachment
+
+    def remove_attachment(self, name):
+        with self._lock:
+            self._remove_attachment(name)
+
+    def _remove_attachment(self, name):
+        for attachment in [a for a in self.attachments if a.name == name]:
+            if attachment._digest is not None:
+                self.store.release(attachment._digest)
+            self.attachments.remove(attachment)
+
+    # --- Budget ---
+    def _enforce_budget(self):
+        # Spill the biggest in-memory attachments first, until the rest fits in the budget
+        in_memory_attachments = [a for a in self.attachments if not a.spilled]
+        in_memory = sum(a.size for a in in_memory_attachments)
+        for attachment in sorted(in_memory_attachments, key=lambda a: a.size, reverse=True):
+            if in_memory <= self.budget_bytes:
+                break
+            attachment._digest = self.store.put(attachment._data)
+            attachment._data = None
+            in_memory -= attachment.size
+
+    def memory_usage(self):
+        """
+        Returns {'memory_bytes', 'disk_bytes', 'shared_bytes', 'budget_bytes'} for this session.
+        shared_bytes is data held once for all sessions using it, not counted in memory_bytes.
+        """
+        with self._lock:
+            memory = sum(a.size for a in self.attachments if not a.spilled)
+            disk = sum(a.size for a in self.attachments if a.spilled)
+            shared = 0
+            if self._contacts is not None:
+                shared = self._contacts_size
+            else:
+                disk += self._contacts_size
+            return {"memory_bytes": memory, "disk_bytes": disk, "shared_bytes": shared, "budget_bytes": self.budget_bytes}
+
+    def release(self):
+        """Frees all contacts and attachments of the session, in memory and on disk."""
+        with self._lock:
+            self._drop_contacts()
+            for attachment in list(self.attachments):
+                self._remove_attachment(attachment.name)
+            for slot in list(self._shared):
+                self._release_shared(slot)
+            self.released = True
+
+
+_store = None
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def create_session_resources(budget_bytes=SESSION_MEMORY_BUDGET_BYTES):
+    """Creates and registers the resources of a new session; idle sessions are released on the way."""
+    global _store
+    with _sessions_lock:
+        if _store is None:
+            _store = BlobStore()
+        _release_idle_sessions()
+        resources = SessionResources(_store, budget_bytes)
+        _sessions[resources.id] = resources
+        return resources
+
+
+def release_session_resources(resources):
+    with _sessions_lock:
+        _sessions.pop(resources.id, None)
+    resources.release()
+
+
+def release_idle_sessions(timeout=SESSION_IDLE_TIMEOUT_SECONDS):
+    """Releases sessions not used for timeout seconds. Returns how many were released."""
+    with _sessions_lock:
+        return _release_idle_sessions(timeout)
+
+
+def _release_idle_sessions(timeout=SESSION_IDLE_TIMEOUT_SECONDS):
+    now = time.time()
+    idle = [resources for resources in _sessions.values() if now - resources.last_used > timeout]
+    for resources in idle:
+        del _sessions[resources.id]
+        resources.release()
+    return len(idle)
@@ -0,0 +1,93 @@
+# shared_store.py
+import collections
+import hashlib
+import threading
+import types
+
+# A parsed workbook as shared between sessions: frozen contacts, the loader's issue
+# messages, and the estimated size in bytes of the contacts. A set too large to keep in
+# memory has contacts None and digest naming its JSON copy in the session blob store.
+SharedContactSet = collections.namedtuple("SharedContactSet", ["contacts", "issues", "size", "digest"],
+                                          defaults=(None,))
+
+
+def content_key(namespace, data):
+    """Store key for some bytes: the namespace plus their SHA-256, so equal content shares one entry."""
+    return f"{namespace}:{hashlib.sha256(data).hexdigest()}"
+
+
+def freeze_contacts(contacts):
+    """Returns a read-only copy of contact dicts, safe to hand to several sessions at once."""
+    return tuple(types.MappingProxyType(dict(contact)) for contact in contacts)
+
+
+class SharedStore:
+    """
+    Process-wide, reference-counted store of immutable values keyed by content hash.
+
+    acquire() returns the value for a key, calling the loader only if no session holds it
+    yet (concurrent acquirers of the same key wait for a single load). Every acquire()
+    must be matched by a release(); the value is evicted when the last holder lets go,
+    calling the on_evict given when it was loaded (e.g. to delete its copy on disk).
+    """
+    def __init__(self):
+        self._entries = {}  # key -> [value, reference count, on_evict]
+        self._loading = {}  # key -> threading.Event set when the load has finished
+        self._lock = threading.Lock()
+
+    def acquire(self, key, loader, on_evict=None):
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry[1] += 1
+                    return entry[0]
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            loading.wait() # Another session is loading this key; then take a reference to its value
+
+        try:
+            value = loader()
+        except BaseException:
+            with self._lock:
+                self._loading.pop(key).set()
+            raise
+        with self._lock:
+            self._entries[key] = [value, 1, on_evict]
+            self._loading.pop(key).set()
+        return value
+
+    def release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            del self._entries[key]
+        if entry[2] is not None:
+            entry[2](entry[0])
+
+    def references(self, key):
+        """Number of holders of a key (0 if not stored)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "references": sum(entry[1] for entry in self._entries.values()),
+            }
+
+
+_default_store = SharedStore()
+
+
+def get_shared_store():
+    """Returns the process-wide shared store."""
+    return _default_store
@@ -1,17 +1,22 @@
 # streamlit_app.py
 
 import streamlit as st
-import pandas as pd
 from data_handler import load_contacts_from_excel
-from email_agent import SmartEmailAgent
+from email_agent import get_shared_agent, DEFAULT_MODEL
+from template_cache import get_default_cache
+from agent_metrics import get_memory_sink
 from email_tool import send_bulk_email_messages
-from config import SENDER_EMAIL, OPENAI_API_KEY, FAILED_EMAILS_LOG_PATH, BREVO_API_KEY
-from translations import LANGUAGES, _t, set_language
-import datetime
+from email_renderer import PreviewRenderer, find_unresolved_placeholders, contact_language
+from send_worker import start_send_job, get_send_job
+from campaign_control import CampaignCheckpoint, campaign_key
+from session_resources import (create_session_resources, release_session_resources, release_idle_sessions,
+                               estimate_contacts_size)
+from shared_store import SharedContactSet, content_key, freeze_contacts
+from config import SENDER_EMAIL, OPENAI_API_KEY, BREVO_API_KEY, AI_BACKEND
+from translations import LANGUAGES, TRANSLATIONS, _t, set_language
 import os
-import shutil
+import time
 import tempfile
-import re
 
 # --- CSS Styling ---
 st.markdown("""
@@ -97,17 +102,26 @@ def init_state():
     if 'initialized' not in st.session_state:
         st.session_state.language = 'fr'
         st.session_state.page = 'generate'
-        st.session_state.contacts = []
         st.session_state.contact_issues = []
-        st.session_state.attachments = [] # Stores UploadedFile objects
+        # Contacts and attachments live in the session resource manager, under a memory budget
+        st.session_state.resources = create_session_resources()
+        st.session_state.attachment_uploader_run = 0 # Bumped to empty the attachment uploader
         st.session_state.email_sending_status = []
         st.session_state.sending_summary = {'total_contacts':0, 'successful':0, 'failed':0}
         st.session_state.detailed_response = None
+        st.session_state.recipient_results = None # DataFrame, one row per recipient, built once per send job
+        st.session_state.results_export = None # (job id, filters, CSV bytes, Parquet bytes or None) once prepared
         st.session_state.generation_in_progress = False
         st.session_state.sending_in_progress = False
+        st.session_state.send_job_id = None # Background send followed by the results page
         st.session_state.user_prompt = ''
         st.session_state.user_email_context = ''
         st.session_state.personalize_emails = False
+        st.session_state.force_refresh_generation = False # Skip the template cache and ask the AI again
+        st.session_state.generate_all_languages = False # Generate one version per supported language
+        st.session_state.template_variants = {} # {language: {'subject', 'body'}} when several versions exist
+        st.session_state.failed_variant_languages = [] # Languages whose version could not be generated
+        st.session_state.editing_language = None # Language of the version shown in the editable fields
         st.session_state.generic_greeting = ''
         st.session_state.template_subject = ''
         st.session_state.template_body = ''
@@ -119,6 +133,52 @@ def init_state():
         st.session_state.initialized = True
 init_state()
 
+def _contacts():
+    """Contacts of this session (the read-only copy shared by sessions that uploaded the same workbook)."""
+    return st.session_state.resources.contacts()
+
+def _parse_workbook(data, suffix):
+    """Parses an uploaded workbook into a SharedContactSet (run once per distinct workbook)."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        tmp_file.write(data)
+    try:
+        contacts, issues = load_contacts_from_excel(tmp_file.name)
+    finally:
+        os.remove(tmp_file.name)
+    return SharedContactSet(freeze_contacts(contacts), tuple(issues), estimate_contacts_size(contacts))
+
+def _preview_renderer():
+    """Memoized live preview, shared by every session previewing the same contact set."""
+    resources = st.session_state.resources
+    key = f"preview:{resources.contacts_key or resources.id}"
+    return resources.use_shared("preview", key, PreviewRenderer)
+
+def reset_session():
+    """Frees the session's contacts and attachments and starts over with default state."""
+    release_session_resources(st.session_state.resources)
+    keys_to_clear = [
+        'initialized', 'language', 'page', 'resources', 'attachment_uploader_run', 'contact_issues',
+        'email_sending_status', 'sending_summary', 'detailed_response', 'recipient_results', 'results_export',
+        'results_status_filter', 'results_search', 'results_page_size', 'results_page_number',
+        'generation_in_progress', 'sending_in_progress', 'send_job_id', 'user_prompt',
+        'user_email_context', 'personalize_emails', 'force_refresh_generation', 'generic_greeting',
+        'generate_all_languages', 'template_variants', 'failed_variant_languages', 'editing_language',
+        'template_subject', 'template_body', 'editable_subject', 'editable_body',
+        'uploaded_file_name', 'show_generation_section', 'email_generated',
+        'preview_contact_number'
+    ]
+    for k in keys_to_clear:
+        if k in st.session_state:
+            del st.session_state[k]
+    init_state() # Re-initialize to default states
+
+# Sessions left idle too long have their data freed; start such a session over
+if st.session_state.resources.released:
+    reset_session()
+    st.info(_t("Your session was inactive for a long time and has been reset."))
+st.session_state.resources.touch()
+release_idle_sessions()
+
 # --- Language Selection (moved to main content area) ---
 # Apply the selected language immediately after initialization
 set_language(st.session_state.language)
@@ -198,10 +258,9 @@ def _add_greeting_to_body(body_content, greeting_text, current_language):
     if not greeting_text:
         return body_content # No greeting to add
 
-    # Get the appropriate salutation prefix based on language
-    salutation_prefix = _t("Dear") # Default to "Dear"
-    if current_language == 'fr':
-        salutation_prefix = _t("Bonjour") # Use "Bonjour" for French
+    # Get the appropriate salutation prefix based on language ("Dear" / "Bonjour"),
+    # looked up for the target language rather than the UI language
+    salutation_prefix = TRANSLATIONS.get(current_language, {}).get("Dear", "Dear")
 
     # Check if the greeting_text already starts with a salutation in the current language
     salutations_to_check = {
@@ -223,138 +282,196 @@ def _add_greeting_to_body(body_content, greeting_text, current_language):
     return body_prefix + body_content
 
 # --- Business Logic ---
+def _finalize_generated_body(body, language):
+    """Applies the generic greeting to a generated body when emails are not personalized."""
+    if st.session_state.personalize_emails:
+        return body
+    actual_greeting = st.session_state.generic_greeting or TRANSLATIONS.get(language, {}).get("Valued Customer", "Valued Customer")
+    return _add_greeting_to_body(body, actual_greeting, language)
+
+def _current_variants():
+    """Returns the language versions with the version being edited updated from the editable fields."""
+    variants = dict(st.session_state.template_variants)
+    if variants:
+        variants[st.session_state.editing_language] = {
+            'subject': st.session_state.editable_subject,
+            'body': st.session_state.editable_body,
+        }
+    return variants
+
+def _template_for_contact(contact):
+    """Returns the (subject, body) template a contact will receive, following its language column."""
+    variants = _current_variants()
+    if variants:
+        variant = variants.get(contact_language(contact, st.session_state.editing_language)) or variants[st.session_state.editing_language]
+        return variant['subject'], variant['body']
+    return st.session_state.editable_subject, st.session_state.editable_body
+
 def generate_email_preview_and_template():
     st.session_state.generation_in_progress = True
     # Ensure OPENAI_API_KEY is available. config.py should handle this.
-    if not OPENAI_API_KEY:
+    if not OPENAI_API_KEY and AI_BACKEND != "stub":
         st.error(_t("OpenAI API Key is not configured. Please set it in Streamlit secrets."))
         st.session_state.generation_in_progress = False
         return
 
-    agent = SmartEmailAgent(openai_api_key=OPENAI_API_KEY)
-    
-    template = agent.generate_email_template(
-        prompt=st.session_state.user_prompt,
-        user_email_context=st.session_state.user_email_context,
-        output_language=st.session_state.language,
-        personalize_emails=st.session_state.personalize_emails
-    )
-    
+    agent = get_shared_agent(openai_api_key=OPENAI_API_KEY) # Shared by all sessions: reuses HTTP connections
+
+    if st.session_state.generate_all_languages:
+        # All language versions are generated in parallel from the same prompt
+        with st.spinner(_t("Generating email template... Please wait.")):
+            variants = agent.generate_language_variants(
+                st.session_state.user_prompt,
+                list(LANGUAGES),
+                user_email_context=st.session_state.user_email_context,
+                personalize_emails=st.session_state.personalize_emails,
+                force_refresh=st.session_state.force_refresh_generation
+            )
+        # A failed language is left out: its contacts get the version being edited instead
+        errors = {language: variant['body'] for language, variant in variants.items() if variant['subject'] == "Error"}
+        variants = {language: variant for language, variant in variants.items() if language not in errors}
+        if not variants:
+            st.error(_t("The email could not be generated: {error}", error=next(iter(errors.values()))))
+            st.session_state.generation_in_progress = False
+            return
+        for language, variant in variants.items():
+            variant['body'] = _finalize_generated_body(variant['body'], language)
+        st.session_state.template_variants = variants
+        st.session_state.failed_variant_languages = list(errors)
+        language = st.session_state.language if st.session_state.language in variants else next(iter(variants))
+        template = variants[language]
+    else:
+        st.session_state.template_variants = {}
+        st.session_state.failed_variant_languages = []
+        # Show the subject and body while the tokens arrive instead of a frozen page
+        stream_box = st.container(border=True)
+        stream_box.caption(_t("Generating email template... Please wait."))
+        subject_placeholder = stream_box.empty()
+        body_placeholder = stream_box.empty()
+        template = None
+        last_refresh = 0.0
+        for partial in agent.generate_email_template_stream(
+            prompt=st.session_state.user_prompt,
+            user_email_context=st.session_state.user_email_context,
+            output_language=st.session_state.language,
+            personalize_emails=st.session_state.personalize_emails,
+            force_refresh=st.session_state.force_refresh_generation
+        ):
+            if partial.pop('done'):
+                template = partial
+                break
+            # Redraw at most ~10 times per second; every token would flood the browser
+            now = time.monotonic()
+            if now - last_refresh >= 0.1:
+                last_refresh = now
+                subject_placeholder.markdown(f"**{_t('Subject')}:** {partial['subject']}")
+                body_placeholder.text(partial['body'])
+        if template['subject'] == "Error":
+            stream_box.empty()
+            st.error(_t("The email could not be generated: {error}", error=template['body']))
+            st.session_state.generation_in_progress = False
+            return
+        language = st.session_state.language
+        template['body'] = _finalize_generated_body(template['body'], language)
+
+    _show_generated_template(template, language)
+
+def _show_generated_template(template, language):
+    """Puts a template (written in language) in the editable fields and moves on to the preview page."""
+    st.session_state.editing_language = language
     st.session_state.template_subject = template['subject']
     st.session_state.template_body = template['body']
     st.session_state.editable_subject = template['subject']
     st.session_state.editable_body = template['body']
 
-    # Apply greeting to editable_body only if not personalizing
-    if not st.session_state.personalize_emails:
-        actual_greeting = st.session_state.generic_greeting if st.session_state.generic_greeting else _t("Valued Customer")
-        st.session_state.editable_body = _add_greeting_to_body(
-            st.session_state.editable_body,
-            actual_greeting,
-            st.session_state.language
-        )
-        st.session_state.template_body = st.session_state.editable_body # Keep template_body updated too
-        
     st.session_state.generation_in_progress = False
     st.session_state.email_generated = True # Set flag to show generated email fields
     st.session_state.page = 'preview' # Set page to preview after generation
     st.rerun() # Rerun to display the generated email
 
+def use_similar_template(template):
+    """Reuses the cached template of a near-identical earlier prompt instead of calling the AI."""
+    st.session_state.template_variants = {}
+    st.session_state.failed_variant_languages = []
+    template = dict(template)
+    template['body'] = _finalize_generated_body(template['body'], st.session_state.language)
+    _show_generated_template(template, st.session_state.language)
+
 def send_all_emails():
+    """Starts the campaign in a background send job and moves to the results page, which follows it."""
+    sender_name = SENDER_EMAIL.split('@')[0].replace('.', ' ').title()
+
+    def send_batch(messages, attachment_paths):
+        # Messages already carry both the HTML and plain-text bodies from the render stage
+        try:
+            return send_bulk_email_messages(
+                sender_email=SENDER_EMAIL,
+                sender_name=sender_name,
+                messages=messages,
+                attachments=attachment_paths
+            )
+        except Exception as e: # Reported for every recipient of the batch; the next batches still go out
+            return {'status': 'error', 'message': f"An unexpected error occurred: {e}"}
+
+    # Sending the same campaign again after a cancel or crash skips who already received it
+    variants = _current_variants()
+    contacts = _contacts()
+    attachments = [(attachment.name, attachment.read()) for attachment in st.session_state.resources.attachments]
+    checkpoint = CampaignCheckpoint(campaign_key(
+        st.session_state.editable_subject, st.session_state.editable_body,
+        st.session_state.personalize_emails, contacts, attachments, variants=variants
+    ))
+
+    # Everything the worker needs is copied now: it keeps running across reruns of this page
+    # With several language versions, each contact gets the one matching its language column
+    job = start_send_job(
+        contacts,
+        st.session_state.editable_subject,
+        st.session_state.editable_body,
+        st.session_state.personalize_emails,
+        send_batch,
+        variants=variants,
+        default_language=st.session_state.editing_language,
+        attachments=attachments,
+        checkpoint=checkpoint
+    )
+    st.session_state.send_job_id = job.id
     st.session_state.sending_in_progress = True
-    total_contacts = len(st.session_state.contacts)
-
-    # Prepare attachments in a temp dir
-    temp_attachment_paths = []
-    with tempfile.TemporaryDirectory() as temp_dir:
-        for uploaded_file in st.session_state.attachments:
-            path = os.path.join(temp_dir, uploaded_file.name)
-            with open(path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            temp_attachment_paths.append(path)
-
-        # Build the list of message dicts
-        messages = []
-        for contact in st.session_state.contacts:
-            email = contact.get('email')
-            name  = contact.get('name', '')
-
-            if not email:
-                continue  # skip missing emails
-
-            # Start from the editable template
-            subj = st.session_state.editable_subject
-            body = st.session_state.editable_body
-
-            # Personalize if needed
-            if st.session_state.personalize_emails:
-                for ph in ["{{Name}}", "{{Nom}}"]:
-                    subj = subj.replace(ph, name)
-                    body = body.replace(ph, name)
-                for ph in ["{{Email}}", "{{Courriel}}"]:
-                    subj = subj.replace(ph, email)
-                    body = body.replace(ph, email)
-            else:
-                # strip any leftover placeholders
-                for ph in ["{{Name}}","{{Nom}}","{{Email}}","{{Courriel}}"]:
-                    subj = subj.replace(ph, "")
-                    body = body.replace(ph, "")
-
-            # ensure HTML formatting
-            body_html = body.replace("\n", "<br>\n")
-
-            messages.append({
-                "to_email": email,
-                "to_name": name,
-                "subject": subj,
-                "body": body_html
-            })
-
-        # Send all at once
-        result = send_bulk_email_messages(
-            sender_email=SENDER_EMAIL,
-            sender_name=SENDER_EMAIL.split('@')[0].replace('.', ' ').title(),
-            messages=messages,
-            attachments=temp_attachment_paths if temp_attachment_paths else None
-        )
+    st.session_state.recipient_results = None # The previous campaign's table, if any
+    st.session_state.results_export = None
+    st.session_state.page = 'results'
+    st.rerun()
 
-    # Build status & summary
+def _finish_send_job(job):
+    """Builds the status lines and summary of a finished send job for the results page."""
+    total_contacts = job.total
+    success = job.success
+    failure_lines = list(job.failure_lines)
+    if job.state == "cancelled":
+        failure_lines.append(_t("⚠️ Sending was cancelled: {count} email(s) were not sent.", count=total_contacts - job.processed))
+    elif job.state == "failed":
+        failure_lines.append(f"❌ Sending stopped: {job.error}")
+    import pandas as pd # Deferred like in data_handler: only needed for the results table
+    # Built once here rather than on every rerun of the results page (paging, filtering)
+    st.session_state.recipient_results = pd.DataFrame(job.recipients)
+    st.session_state.results_export = None
+
+    # Build status & summary: (level, text) pairs; per-recipient details go to the results table
+    fail = total_contacts - success
     status = []
-    result_status = result.get("status")
-    result_message = result.get("message", "")
-    
-    if result_status == "success":
-        message_ids = result.get("message_ids", [])
-        total_sent = result.get("total_sent", len(messages))
-        success = total_sent
-        fail = total_contacts - success
-        
+    if job.skipped:
+        status.append(("info", _t("{count} recipient(s) already received this campaign in an earlier, interrupted send and are skipped.", count=job.skipped)))
+    if success > 0:
         # Add detailed status information
-        status.append(_t("✅ Bulk send completed successfully!"))
-        status.append(_t("📧 Total emails sent: ") + str(success))
-        status.append(_t("📊 Success rate: ") + f"{success}/{total_contacts} ({(success/total_contacts*100):.1f}%)")
-        
-        # Add individual message IDs if available
-        if message_ids:
-            status.append(f"📋 Message IDs received: {len(message_ids)}")
-            for i, msg_id in enumerate(message_ids, 1):
-                recipient_email = messages[i-1]['to_email'] if i <= len(messages) else f"Recipient {i}"
-                status.append(f"   {i}. {recipient_email}: {msg_id}")
-        
-        if fail > 0:
-            status.append(f"⚠️ {fail} emails failed to send")
-            
-    elif result_status == "partial_success":
-        # Extract success count from message
-        import re
-        success_match = re.search(r'(\d+) emails sent successfully', result_message)
-        success = int(success_match.group(1)) if success_match else 0
-        fail = total_contacts - success
-        status.append(f"⚠️ Partial success: {result_message}")
-    else:
-        success = 0
-        fail = total_contacts
-        status.append(f"❌ Bulk send failed: {result_message}")
+        if not failure_lines:
+            status.append(("success", _t("✅ Bulk send completed successfully!")))
+        else:
+            status.append(("warning", f"⚠️ Partial success: {success}/{total_contacts}"))
+        status.append(("info", _t("📧 Total emails sent: ") + str(success)))
+        status.append(("info", _t("📊 Success rate: ") + f"{success}/{total_contacts} ({(success/total_contacts*100):.1f}%)"))
+    status.extend(("error", line) for line in failure_lines)
+    if success > 0 and fail > 0:
+        status.append(("warning", f"⚠️ {fail} emails failed to send"))
 
     st.session_state.email_sending_status = status
     st.session_state.sending_summary = {
@@ -362,10 +479,38 @@ def send_all_emails():
         'successful': success,
         'failed': fail
     }
-    # Store detailed response data for the results page
-    st.session_state.detailed_response = result
-    st.session_state.page = 'results'
+    # Store detailed response data for the results page (one result per batch)
+    st.session_state.detailed_response = job.batch_results
     st.session_state.sending_in_progress = False
+
+def _follow_send_job(job):
+    """Shows the live progress of a running send job; reruns the page until it has finished."""
+    job.poll()
+    if job.done:
+        _finish_send_job(job)
+        return
+    if job.state == "cancelling":
+        st.progress(job.progress, text=_t("Cancelling: finishing the batches already sent..."))
+    elif job.state == "paused":
+        st.progress(job.progress, text=_t("Paused: no new batch is sent until you resume."))
+    else:
+        st.progress(job.progress, text=_t("Sending emails. Please wait."))
+    st.caption(_t("{processed} of {total} contacts processed, {success} sent.",
+                  processed=job.processed, total=job.total, success=job.success))
+    if job.skipped:
+        st.caption(_t("{count} recipient(s) already received this campaign in an earlier, interrupted send and are skipped.", count=job.skipped))
+    if job.state in ("running", "paused"):
+        col_pause, col_cancel = st.columns(2)
+        with col_pause:
+            if job.state == "running":
+                if st.button(_t("Pause sending"), use_container_width=True, key="pause_send_button"):
+                    job.pause()
+            elif st.button(_t("Resume sending"), use_container_width=True, key="resume_send_button"):
+                job.resume()
+        with col_cancel:
+            if st.button(_t("Cancel sending"), use_container_width=True, key="cancel_send_button"):
+                job.cancel()
+    time.sleep(0.5) # Poll interval
     st.rerun()
 
 # --- Page: Generate ---
@@ -391,14 +536,16 @@ def page_generate():
        (st.session_state.uploaded_file_name is None or \
         st.session_state.uploaded_file_name != uploaded_file.name):
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp_file:
-            shutil.copyfileobj(uploaded_file, tmp_file)
-            st.session_state.uploaded_file_path = tmp_file.name # Store path for access
-        
         st.session_state.uploaded_file_name = uploaded_file.name
-        contacts, issues = load_contacts_from_excel(st.session_state.uploaded_file_path)
-        st.session_state.contacts = contacts
+        # Sessions uploading the same workbook share one parsed, read-only copy of it
+        workbook = uploaded_file.getvalue()
+        contact_set = st.session_state.resources.set_shared_contacts(
+            content_key("contacts", workbook),
+            lambda: _parse_workbook(workbook, os.path.splitext(uploaded_file.name)[1] or ".xlsx")
+        )
+        contacts, issues = _contacts(), list(contact_set.issues) # Read back from disk if the set was spilled
         st.session_state.contact_issues = issues
+        st.session_state.pop("preview_contact_number", None) # Start the preview again at the first contact
         st.session_state.show_generation_section = True # Show the AI generation form
         
         if issues:
@@ -414,7 +561,7 @@ def page_generate():
 
     # Moved this block to only show if no file has been successfully uploaded yet,
     # preventing duplicate messages.
-    if not st.session_state.uploaded_file_name and not st.session_state.contacts:
+    if not st.session_state.uploaded_file_name and not _contacts():
         st.info(_t("Please upload an Excel file to get started."))
 
     if st.session_state.show_generation_section:
@@ -450,6 +597,38 @@ def page_generate():
                 key="generic_greeting_input"
             )
 
+        st.session_state.generate_all_languages = st.checkbox(
+            _t("Generate a version in every language (contacts get the one matching their Language column)"),
+            value=st.session_state.generate_all_languages,
+            key="generate_all_languages_checkbox"
+        )
+
+        st.session_state.force_refresh_generation = st.checkbox(
+            _t("Force a new generation (ignore previously generated results)"),
+            value=st.session_state.force_refresh_generation,
+            key="force_refresh_generation_checkbox"
+        )
+
+        # Offer the template of an almost identical earlier prompt: instant and free.
+        # Only the local cache is read, so no AI client (or API key) is needed for this.
+        similar = None
+        if (st.session_state.user_prompt and not st.session_state.generate_all_languages
+                and not st.session_state.force_refresh_generation):
+            template_cache = get_default_cache()
+            similar = template_cache.find_similar(
+                st.session_state.user_prompt,
+                template_cache.make_scope(DEFAULT_MODEL, st.session_state.user_email_context,
+                                          st.session_state.language, st.session_state.personalize_emails)
+            )
+        if similar is not None and similar['prompt'] != st.session_state.user_prompt:
+            st.info(_t(
+                "An email was already generated for a very similar request ({similarity}% similar): \"{prompt}\"",
+                similarity=f"{similar['similarity'] * 100:.0f}",
+                prompt=similar['prompt']
+            ))
+            if st.button(_t("Use this email"), use_container_width=True, key="use_similar_template_button"):
+                use_similar_template(similar['template'])
+
         st.markdown("---")
         if st.button(
             _t("Generate Email"),
@@ -463,8 +642,52 @@ def page_generate():
             else:
                 st.warning(_t("Please provide instructions for the AI to generate the email."))
 
+        cache_stats = get_default_cache().stats()
+        if cache_stats['hits'] + cache_stats['misses'] > 0:
+            st.caption(_t(
+                "Template cache: {hit_rate}% hit rate, {saved}s of generation time saved.",
+                hit_rate=f"{cache_stats['hit_rate'] * 100:.0f}",
+                saved=f"{cache_stats['latency_saved']:.1f}"
+            ))
+
+        ai_call_summary = get_memory_sink().summary()
+        if ai_call_summary:
+            with st.expander(_t("AI call statistics")):
+                import pandas as pd # Deferred like in data_handler: only needed for these tables
+                st.dataframe(pd.DataFrame([
+                    {
+                        "call": name,
+                        "calls": stats['calls'],
+                        "errors": stats['errors'],
+                        "cache hits": stats['cache_hits'],
+                        "p50 (s)": stats['wall_time']['p50'],
+                        "p90 (s)": stats['wall_time']['p90'],
+                        "first token p50 (s)": stats['time_to_first_token']['p50'],
+                        "prompt tokens": stats['prompt_tokens'],
+                        "completion tokens": stats['completion_tokens'],
+                    }
+                    for name, stats in ai_call_summary.items()
+                ]), use_container_width=True, hide_index=True)
+
 
 # --- Page: Preview ---
+def _step_preview_contact(delta):
+    """Moves the live preview to the previous/next contact (button callback)."""
+    total = len(_contacts())
+    current = st.session_state.get("preview_contact_number", 1)
+    st.session_state.preview_contact_number = min(max(current + delta, 1), max(total, 1))
+
+def _switch_editing_language():
+    """Saves the version being edited and loads the newly selected language version (radio callback)."""
+    st.session_state.template_variants = _current_variants()
+    new_language = st.session_state.editing_language_radio
+    variant = st.session_state.template_variants[new_language]
+    st.session_state.editing_language = new_language
+    st.session_state.editable_subject = variant['subject']
+    st.session_state.editable_body = variant['body']
+    st.session_state.preview_subject_input = variant['subject']
+    st.session_state.preview_body_input = variant['body']
+
 def page_preview():
     # --- Custom CSS for this page ---
     st.markdown("""
@@ -510,9 +733,9 @@ def page_preview():
             unsafe_allow_html=True
         )
     with title_cols[1]:
-        st.markdown(f"<h4>{_t('Live Preview for First Contact')}</h4>", unsafe_allow_html=True)
+        st.markdown(f"<h4>{_t('Live Preview')}</h4>", unsafe_allow_html=True)
         st.markdown(
-            f"<div class='info-text-normal'>{_t('This shows how the email will appear for the first contact. To make changes, use the *Editable Email Content* section on the left.')}</div>",
+            f"<div class='info-text-normal'>{_t('This shows how the email will appear for the selected contact. Use the arrows to browse your contacts. To make changes, use the *Editable Email Content* section on the left.')}</div>",
             unsafe_allow_html=True
         )
 
@@ -521,6 +744,23 @@ def page_preview():
 
     with col1:
         with st.container(border=True):
+            if st.session_state.failed_variant_languages:
+                st.warning(_t(
+                    "No version could be generated in {languages}: those contacts will receive the version in {language}. Generate again to retry.",
+                    languages=", ".join(LANGUAGES.get(code, code) for code in st.session_state.failed_variant_languages),
+                    language=LANGUAGES.get(st.session_state.editing_language, st.session_state.editing_language)
+                ))
+            if st.session_state.template_variants:
+                variant_languages = list(st.session_state.template_variants)
+                st.radio(
+                    _t("Language version"),
+                    variant_languages,
+                    index=variant_languages.index(st.session_state.editing_language),
+                    format_func=lambda code: LANGUAGES.get(code, code),
+                    horizontal=True,
+                    key="editing_language_radio",
+                    on_change=_switch_editing_language
+                )
             st.text_input(_t("Recipient"), value="{{Email}}>", disabled=True)
 
             
@@ -539,28 +779,40 @@ def page_preview():
     with col2:
         with st.container(border=True):
             
-            if st.session_state.contacts:
-                first_contact = st.session_state.contacts[0]
-                preview_name = first_contact.get('name', '')
-                preview_email = first_contact.get('email', '')
+            contacts = _contacts()
+            if contacts:
+                total = len(contacts)
+                # Keep the selected contact valid if the list got shorter
+                if st.session_state.get("preview_contact_number", 1) > total:
+                    st.session_state.preview_contact_number = total
+
+                nav_prev, nav_number, nav_next = st.columns([0.2, 0.6, 0.2])
+                with nav_prev:
+                    st.button("←", key="preview_prev_contact", on_click=_step_preview_contact, args=(-1,), use_container_width=True)
+                with nav_number:
+                    contact_number = st.number_input(
+                        _t("Contact (1 to {total})", total=total),
+                        min_value=1,
+                        max_value=total,
+                        step=1,
+                        key="preview_contact_number"
+                    )
+                with nav_next:
+                    st.button("→", key="preview_next_contact", on_click=_step_preview_contact, args=(1,), use_container_width=True)
+
+                contact_index = int(contact_number) - 1
+                preview_contact = contacts[contact_index]
+                preview_name = preview_contact.get('name', '')
+                preview_email = preview_contact.get('email', '')
 
                 st.text_input(_t("Recipient"), value=f"{preview_name} <{preview_email}>", disabled=True)
 
-                preview_subj = st.session_state.editable_subject
-                preview_body = st.session_state.editable_body
-
-                if st.session_state.personalize_emails:
-                    for placeholder in ["{{Name}}", "{{Nom}}"]:
-                        preview_subj = preview_subj.replace(placeholder, preview_name)
-                        preview_body = preview_body.replace(placeholder, preview_name)
-                    for placeholder in ["{{Email}}", "{{Courriel}}"]:
-                        preview_subj = preview_subj.replace(placeholder, preview_email)
-                        preview_body = preview_body.replace(placeholder, preview_email)
-                else:
-                    for ph in ["{{Name}}","{{Nom}}","{{Email}}","{{Courriel}}"]:
-                        preview_subj = preview_subj.replace(ph, "")
-                        preview_body = preview_body.replace(ph, "")
-                
+                # Memoized per (template hash, contact index): only a field that changed is re-rendered
+                renderer = _preview_renderer()
+                subject_template, body_template = _template_for_contact(preview_contact)
+                preview_subj = renderer.render(subject_template, contacts, contact_index, st.session_state.personalize_emails)
+                preview_body = renderer.render(body_template, contacts, contact_index, st.session_state.personalize_emails)
+
                 st.text_input(_t("Subject"), value=preview_subj, disabled=True, key="preview_subj_display")
                 st.text_area(_t("Body"), value=preview_body, height=350, disabled=True, key="preview_body_display")
             else:
@@ -569,44 +821,140 @@ def page_preview():
     # --- Attachments Section (spans full width) ---
     st.markdown("---")
     st.markdown(f"**{_t('Add Attachments')}**")
+    resources = st.session_state.resources
     uploaded_attachments = st.file_uploader(
         _t("Upload files"),
         type=None,
         accept_multiple_files=True,
-        key="attachment_uploader"
+        # A new key once the files are taken over empties the uploader, so Streamlit drops its own copy
+        key=f"attachment_uploader_{st.session_state.attachment_uploader_run}"
     )
     if uploaded_attachments:
         for uploaded_file in uploaded_attachments:
-            if not any(att.name == uploaded_file.name for att in st.session_state.attachments):
-                st.session_state.attachments.append(uploaded_file)
-        st.info(_t("Attachments selected: {count}", count=len(st.session_state.attachments)))
+            if not any(att.name == uploaded_file.name for att in resources.attachments):
+                resources.add_attachment(uploaded_file.name, uploaded_file.getvalue())
+        st.session_state.attachment_uploader_run += 1
+        st.rerun()
 
-    if st.session_state.attachments:
+    if resources.attachments:
+        st.info(_t("Attachments selected: {count}", count=len(resources.attachments)))
         st.markdown(f"**{_t('Current Attachments')}**")
-        for i, att in enumerate(st.session_state.attachments):
+        for i, att in enumerate(resources.attachments):
             col_att_name, col_att_remove = st.columns([0.8, 0.2])
             with col_att_name:
                 st.write(f"- {att.name}")
             with col_att_remove:
                 if st.button("X", key=f"remove_attachment_{i}"):
-                    st.session_state.attachments.pop(i)
+                    resources.remove_attachment(att.name)
                     st.rerun()
 
+    usage = resources.memory_usage()
+    st.caption(_t(
+        "Session data: {memory} MB in memory, {disk} MB on disk, {shared} MB shared with other sessions (memory budget {budget} MB).",
+        memory=f"{usage['memory_bytes'] / 1e6:.1f}",
+        disk=f"{usage['disk_bytes'] / 1e6:.1f}",
+        shared=f"{usage['shared_bytes'] / 1e6:.1f}",
+        budget=f"{usage['budget_bytes'] / 1e6:.0f}"
+    ))
+
     st.markdown("---")
     # --- Final Send Button ---
     if st.button(_t("Confirm Send"), use_container_width=True, key="confirm_send_button", disabled=st.session_state.sending_in_progress, type="primary"):
-        if not st.session_state.contacts:
+        if not _contacts():
             st.warning(_t("No contacts loaded to send emails to."))
         elif not st.session_state.editable_subject or not st.session_state.editable_body:
             st.warning(_t("Subject and Body cannot be empty. Please go back to Generation if needed."))
         else:
-            send_all_emails()
+            # Never mail out literal '{{Placeholder}}' text: report it and stop here instead
+            templates_to_check = [st.session_state.editable_subject, st.session_state.editable_body]
+            for variant in _current_variants().values():
+                templates_to_check += [variant['subject'], variant['body']]
+            unresolved = find_unresolved_placeholders(
+                templates_to_check,
+                _contacts(),
+                st.session_state.personalize_emails
+            )
+            if unresolved:
+                st.error(_t("Some placeholders cannot be filled from your contacts file. Add the matching columns or values, or edit the template:"))
+                for placeholder, missing in unresolved.items():
+                    st.write(f"- `{{{{{placeholder}}}}}`: " + _t("missing for {count} contact(s)", count=missing))
+            else:
+                send_all_emails()
 
 # --- Page: Results ---
+RESULTS_PAGE_SIZES = (50, 100, 500)
+
+def render_recipient_results(results):
+    """Per-recipient outcome table: filtered, shown one page at a time, exportable in full."""
+    st.subheader(_t("Recipients"))
+    status_labels = {"all": _t("All"), "sent": _t("Sent"), "failed": _t("Failed")}
+    col_status, col_search, col_size = st.columns([1, 2, 1])
+    with col_status:
+        status_filter = st.selectbox(_t("Status"), list(status_labels), format_func=status_labels.get, key="results_status_filter")
+    with col_search:
+        search = st.text_input(_t("Search email or name"), key="results_search")
+    with col_size:
+        page_size = st.selectbox(_t("Rows per page"), RESULTS_PAGE_SIZES, key="results_page_size")
+
+    filtered = results
+    if status_filter != "all":
+        filtered = filtered[filtered["status"] == status_filter]
+    if search:
+        needle = search.strip().lower()
+        filtered = filtered[
+            filtered["email"].str.lower().str.contains(needle, regex=False) |
+            filtered["name"].str.lower().str.contains(needle, regex=False)
+        ]
+
+    page_count = max(1, -(-len(filtered) // page_size))
+    if st.session_state.get("results_page_number", 1) > page_count: # The filter left fewer pages
+        st.session_state.results_page_number = page_count
+    page_number = st.number_input(
+        _t("Page"), min_value=1, max_value=page_count, step=1, key="results_page_number"
+    ) if page_count > 1 else 1
+    start = (page_number - 1) * page_size
+    # Only the rows of the current page are sent to the browser
+    st.dataframe(filtered.iloc[start:start + page_size], use_container_width=True, hide_index=True)
+    st.caption(_t("Page {page} of {pages} — {count} of {total} recipients match.",
+                  page=page_number, pages=page_count, count=len(filtered), total=len(results)))
+
+    # Serializing every row is only worth it when asked for, not on each page change or keystroke
+    export_id = (st.session_state.send_job_id, status_filter, search)
+    export = st.session_state.results_export
+    if export is None or export[0] != export_id:
+        if st.button(_t("Prepare export"), use_container_width=True, key="prepare_results_export"):
+            try:
+                parquet_data = filtered.to_parquet(index=False)
+            except ImportError: # Needs pyarrow or fastparquet
+                parquet_data = None
+            st.session_state.results_export = (export_id, filtered.to_csv(index=False).encode("utf-8"), parquet_data)
+            st.rerun()
+        return
+    _, csv_data, parquet_data = export
+    col_csv, col_parquet = st.columns(2)
+    with col_csv:
+        st.download_button(
+            _t("Export CSV"), csv_data, file_name="send_results.csv",
+            mime="text/csv", use_container_width=True, key="export_results_csv"
+        )
+    with col_parquet:
+        if parquet_data is not None:
+            st.download_button(
+                _t("Export Parquet"), parquet_data, file_name="send_results.parquet",
+                mime="application/octet-stream", use_container_width=True, key="export_results_parquet"
+            )
+
 def page_results():
     st.subheader(_t("3. Results"))
     render_step_indicator(3)
 
+    if st.session_state.sending_in_progress:
+        job = get_send_job(st.session_state.send_job_id)
+        if job is None: # Worker state lost (e.g. server restarted)
+            st.session_state.sending_in_progress = False
+        else:
+            _follow_send_job(job)
+
     summary = st.session_state.sending_summary
     total = summary['total_contacts']
     successful = summary['successful']
@@ -632,40 +980,18 @@ def page_results():
         st.metric(_t("Emails Failed to Send"), failed)
     
     st.markdown("---")
-    if st.button(_t("Show Activity Log and Errors"), use_container_width=True, key="show_log_button"):
-        st.subheader(_t("Activity Log"))
-        # Using a container to display log entries dynamically
-        log_display_container = st.container() 
-        if st.session_state.email_sending_status:
-            for log_entry in st.session_state.email_sending_status:
-                # Check for different types of log entries and format accordingly
-                if "❌" in log_entry or "error" in log_entry.lower() or "failed" in log_entry.lower():
-                    log_display_container.error(log_entry)
-                elif "✅" in log_entry or "success" in log_entry.lower():
-                    log_display_container.success(log_entry)
-                elif "📋" in log_entry or log_entry.strip().startswith("   "):  # Message ID entries
-                    # Use a special container for message IDs with monospace font
-                    log_display_container.markdown(f"```{log_entry}```")
-                elif "⚠️" in log_entry:
-                    log_display_container.warning(log_entry)
-                else:
-                    log_display_container.info(log_entry)
+    if st.session_state.email_sending_status:
+        with st.expander(_t("Activity Log"), expanded=failed > 0):
+            show = {"success": st.success, "warning": st.warning, "error": st.error, "info": st.info}
+            for level, log_entry in st.session_state.email_sending_status:
+                show[level](log_entry)
+
+    if st.session_state.recipient_results is not None and len(st.session_state.recipient_results):
+        render_recipient_results(st.session_state.recipient_results)
 
     st.markdown("---")
     if st.button(_t("Start New Email Session"), use_container_width=True, key="start_new_session_button", type="primary"):
-        # Clear all relevant session state variables
-        keys_to_clear = [
-            'initialized', 'language', 'page', 'contacts', 'contact_issues', 
-            'attachments', 'email_sending_status', 'sending_summary', 'detailed_response',
-            'generation_in_progress', 'sending_in_progress', 'user_prompt', 
-            'user_email_context', 'personalize_emails', 'generic_greeting', 
-            'template_subject', 'template_body', 'editable_subject', 'editable_body',
-            'uploaded_file_name', 'show_generation_section', 'email_generated'
-        ]
-        for k in keys_to_clear:
-            if k in st.session_state:
-                del st.session_state[k]
-        init_state() # Re-initialize to default states
+        reset_session()
         st.rerun() # Force a rerun to restart the app
 
 
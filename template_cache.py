@@ -0,0 +1,189 @@
+# template_cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from config import TEMPLATE_CACHE_PATH, TEMPLATE_CACHE_TTL_SECONDS, PROMPT_SIMILARITY_THRESHOLD
+from prompt_index import PromptIndex
+
+
+class TemplateCache:
+    """
+    Two-level cache for AI generated email templates.
+
+    A small in-memory LRU sits in front of an on-disk SQLite store, so repeated
+    prompts are answered instantly within a process and still hit after a restart.
+    Entries older than ttl_seconds are ignored and removed.
+
+    Prompts are also kept in a similarity index, so find_similar() can offer the
+    template of an earlier prompt worded slightly differently.
+    """
+    def __init__(self, db_path=TEMPLATE_CACHE_PATH, max_memory_entries=256, ttl_seconds=TEMPLATE_CACHE_TTL_SECONDS):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict() # key -> (created_at, latency, template)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0 # Seconds of generation time avoided by cache hits
+        self.similar_hits = 0
+        self._index = None # PromptIndex, loaded from disk on the first similarity lookup
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS templates ("
+                "key TEXT PRIMARY KEY, template TEXT NOT NULL, prompt TEXT, "
+                "created_at REAL NOT NULL, latency REAL NOT NULL)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(templates)")}
+            if "scope" not in columns: # Databases created before the similarity index
+                self._db.execute("ALTER TABLE templates ADD COLUMN scope TEXT")
+                self._db.execute("ALTER TABLE templates ADD COLUMN signature BLOB")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model, prompt, user_email_context, output_language, personalize_emails):
+        """Builds the cache key from everything that influences the generated template."""
+        raw = json.dumps(
+            [model, prompt, user_email_context, output_language, bool(personalize_emails)],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_scope(model, user_email_context, output_language, personalize_emails):
+        """Like make_key but without the prompt: only templates of the same scope are offered as similar."""
+        return TemplateCache.make_key(model, None, user_email_context, output_language, personalize_emails)
+
+    def _expired(self, created_at):
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key):
+        """Returns a copy of the cached template, or None on a miss (or expired entry)."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._memory[key]
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT created_at, latency, template FROM templates WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if self._expired(row[0]):
+                        self._db.execute("DELETE FROM templates WHERE key = ?", (key,))
+                        self._db.commit()
+                    else:
+                        entry = (row[0], row[1], json.loads(row[2]))
+                        self._remember(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            self.latency_saved += entry[1]
+            return dict(entry[2])
+
+    def set(self, key, template, latency, prompt="", scope=None):
+        """Stores a successfully generated template together with how long it took to generate."""
+        entry = (time.time(), latency, dict(template))
+        with self._lock:
+            self._remember(key, entry)
+            signature = None
+            if prompt and scope is not None:
+                index = self._get_index()
+                signature = index.signature(prompt)
+                index.add(key, prompt, scope, signature)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO templates (key, template, prompt, created_at, latency, scope, signature) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, json.dumps(entry[2], ensure_ascii=False), prompt, entry[0], latency, scope,
+                     signature.tobytes() if signature is not None else None)
+                )
+                self._db.commit()
+
+    def _get_index(self):
+        # Signatures are stored with the templates, so loading does not re-hash every prompt
+        if self._index is None:
+            self._index = PromptIndex()
+            if self._db is not None:
+                rows = self._db.execute(
+                    "SELECT key, prompt, scope, signature, created_at FROM templates WHERE signature IS NOT NULL"
+                )
+                for key, prompt, scope, signature, created_at in rows:
+                    if not self._expired(created_at):
+                        self._index.add(key, prompt, scope, array("I", signature))
+        return self._index
+
+    def find_similar(self, prompt, scope, threshold=PROMPT_SIMILARITY_THRESHOLD):
+        """
+        Looks for the template of an earlier prompt close to this one, in the same scope.
+
+        Returns:
+            dict: {'template', 'prompt', 'similarity'} for the closest match, or None.
+        """
+        with self._lock:
+            for key, matched_prompt, similarity in self._get_index().query(prompt, scope, threshold, limit=5):
+                entry = self._memory.get(key)
+                if entry is None and self._db is not None:
+                    row = self._db.execute(
+                        "SELECT created_at, latency, template FROM templates WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        entry = (row[0], row[1], json.loads(row[2]))
+                if entry is None or self._expired(entry[0]):
+                    self._index.remove(key)
+                    continue
+                self.similar_hits += 1
+                return {"template": dict(entry[2]), "prompt": matched_prompt, "similarity": similarity}
+        return None
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        """Returns hit/miss counters, the hit rate (0-1) and the generation time saved in seconds."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "latency_saved": self.latency_saved,
+                "memory_entries": len(self._memory),
+                "similar_hits": self.similar_hits,
+            }
+
+    def clear(self):
+        """Drops every cached template, in memory and on disk."""
+        with self._lock:
+            self._memory.clear()
+            if self._index is not None:
+                self._index.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM templates")
+                self._db.commit()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Returns the process-wide template cache, creating it on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = TemplateCache()
+        return _default_cache
@@ -1,4 +1,5 @@
 # translations.py
+import contextvars
 
 LANGUAGES = {
     "en": "English",
@@ -80,7 +81,43 @@ TRANSLATIONS = {
         "Language": "Language", # For the sidebar selectbox label
         "Dear": "Dear", # Added for dynamic salutation prefix
         "Edit the email template here. Changes will reflect in the live preview.": "Edit the email template here. Changes will reflect in the live preview.", # New info text for editable section
-        "This shows how the email will appear for the first contact. To make changes, use the *Editable Email Content* section on the left.": "This shows how the email will appear for the first contact. To make changes, use the 'Editable Email Content' section on the left." # New info text for preview section
+        "This shows how the email will appear for the first contact. To make changes, use the *Editable Email Content* section on the left.": "This shows how the email will appear for the first contact. To make changes, use the 'Editable Email Content' section on the left.", # New info text for preview section
+        "Some placeholders cannot be filled from your contacts file. Add the matching columns or values, or edit the template:": "Some placeholders cannot be filled from your contacts file. Add the matching columns or values, or edit the template:",
+        "missing for {count} contact(s)": "missing for {count} contact(s)",
+        "Live Preview": "Live Preview",
+        "Contact (1 to {total})": "Contact (1 to {total})",
+        "Force a new generation (ignore previously generated results)": "Force a new generation (ignore previously generated results)",
+        "Generate a version in every language (contacts get the one matching their Language column)": "Generate a version in every language (contacts get the one matching their Language column)",
+        "Language version": "Language version",
+        "The email could not be generated: {error}": "The email could not be generated: {error}",
+        "No version could be generated in {languages}: those contacts will receive the version in {language}. Generate again to retry.": "No version could be generated in {languages}: those contacts will receive the version in {language}. Generate again to retry.",
+        "AI call statistics": "AI call statistics",
+        "An email was already generated for a very similar request ({similarity}% similar): \"{prompt}\"": "An email was already generated for a very similar request ({similarity}% similar): \"{prompt}\"",
+        "Use this email": "Use this email",
+        "Cancel sending": "Cancel sending",
+        "Recipients": "Recipients",
+        "All": "All",
+        "Sent": "Sent",
+        "Failed": "Failed",
+        "Status": "Status",
+        "Search email or name": "Search email or name",
+        "Rows per page": "Rows per page",
+        "Page": "Page",
+        "Page {page} of {pages} — {count} of {total} recipients match.": "Page {page} of {pages} — {count} of {total} recipients match.",
+        "Export CSV": "Export CSV",
+        "Prepare export": "Prepare export",
+        "Export Parquet": "Export Parquet",
+        "Your session was inactive for a long time and has been reset.": "Your session was inactive for a long time and has been reset.",
+        "Session data: {memory} MB in memory, {disk} MB on disk, {shared} MB shared with other sessions (memory budget {budget} MB).": "Session data: {memory} MB in memory, {disk} MB on disk, {shared} MB shared with other sessions (memory budget {budget} MB).",
+        "Cancelling: finishing the batches already sent...": "Cancelling: finishing the batches already sent...",
+        "{processed} of {total} contacts processed, {success} sent.": "{processed} of {total} contacts processed, {success} sent.",
+        "⚠️ Sending was cancelled: {count} email(s) were not sent.": "⚠️ Sending was cancelled: {count} email(s) were not sent.",
+        "Pause sending": "Pause sending",
+        "Resume sending": "Resume sending",
+        "Paused: no new batch is sent until you resume.": "Paused: no new batch is sent until you resume.",
+        "{count} recipient(s) already received this campaign in an earlier, interrupted send and are skipped.": "{count} recipient(s) already received this campaign in an earlier, interrupted send and are skipped.",
+        "Template cache: {hit_rate}% hit rate, {saved}s of generation time saved.": "Template cache: {hit_rate}% hit rate, {saved}s of generation time saved.",
+        "This shows how the email will appear for the selected contact. Use the arrows to browse your contacts. To make changes, use the *Editable Email Content* section on the left.": "This shows how the email will appear for the selected contact. Use the arrows to browse your contacts. To make changes, use the 'Editable Email Content' section on the left."
     },
     "fr": {
         "AI Email Assistant": "Assistant d'E-mail IA",
@@ -154,38 +191,98 @@ TRANSLATIONS = {
         "Language": "Langue",
         "Dear": "Bonjour", # Added for dynamic salutation prefix (translated to Bonjour for French)
         "Edit the email template here. Changes will reflect in the live preview.": "Modifiez le modèle d'e-mail ici. Les modifications se refléteront dans l'aperçu en direct.",
-        "This shows how the email will appear for the first contact. To make changes, use the *Editable Email Content* section on the left.": "Ceci montre l'apparence de l'e-mail pour le premier contact. Pour apporter des modifications, utilisez la section 'Contenu de l'e-mail modifiable' sur la gauche."
+        "This shows how the email will appear for the first contact. To make changes, use the *Editable Email Content* section on the left.": "Ceci montre l'apparence de l'e-mail pour le premier contact. Pour apporter des modifications, utilisez la section 'Contenu de l'e-mail modifiable' sur la gauche.",
+        "Some placeholders cannot be filled from your contacts file. Add the matching columns or values, or edit the template:": "Certains champs de fusion ne peuvent pas être remplis à partir de votre fichier de contacts. Ajoutez les colonnes ou valeurs correspondantes, ou modifiez le modèle :",
+        "missing for {count} contact(s)": "manquant pour {count} contact(s)",
+        "Live Preview": "Aperçu en direct",
+        "Contact (1 to {total})": "Contact (1 à {total})",
+        "Force a new generation (ignore previously generated results)": "Forcer une nouvelle génération (ignorer les résultats déjà générés)",
+        "Generate a version in every language (contacts get the one matching their Language column)": "Générer une version dans chaque langue (chaque contact reçoit celle de sa colonne Langue)",
+        "Language version": "Version linguistique",
+        "The email could not be generated: {error}": "L'e-mail n'a pas pu être généré : {error}",
+        "No version could be generated in {languages}: those contacts will receive the version in {language}. Generate again to retry.": "Aucune version n'a pu être générée en {languages} : ces contacts recevront la version en {language}. Relancez la génération pour réessayer.",
+        "AI call statistics": "Statistiques des appels IA",
+        "An email was already generated for a very similar request ({similarity}% similar): \"{prompt}\"": "Un e-mail a déjà été généré pour une demande très proche ({similarity}% de similarité) : \"{prompt}\"",
+        "Use this email": "Utiliser cet e-mail",
+        "Cancel sending": "Annuler l'envoi",
+        "Recipients": "Destinataires",
+        "All": "Tous",
+        "Sent": "Envoyés",
+        "Failed": "En échec",
+        "Status": "Statut",
+        "Search email or name": "Rechercher un e-mail ou un nom",
+        "Rows per page": "Lignes par page",
+        "Page": "Page",
+        "Page {page} of {pages} — {count} of {total} recipients match.": "Page {page} sur {pages} — {count} destinataires sur {total} correspondent.",
+        "Export CSV": "Exporter en CSV",
+        "Prepare export": "Préparer l'export",
+        "Export Parquet": "Exporter en Parquet",
+        "Your session was inactive for a long time and has been reset.": "Votre session est restée inactive longtemps et a été réinitialisée.",
+        "Session data: {memory} MB in memory, {disk} MB on disk, {shared} MB shared with other sessions (memory budget {budget} MB).": "Données de session : {memory} Mo en mémoire, {disk} Mo sur disque, {shared} Mo partagés avec d'autres sessions (budget mémoire {budget} Mo).",
+        "Cancelling: finishing the batches already sent...": "Annulation : fin des lots déjà envoyés...",
+        "{processed} of {total} contacts processed, {success} sent.": "{processed} contacts traités sur {total}, {success} envoyés.",
+        "⚠️ Sending was cancelled: {count} email(s) were not sent.": "⚠️ L'envoi a été annulé : {count} e-mail(s) n'ont pas été envoyés.",
+        "Pause sending": "Mettre l'envoi en pause",
+        "Resume sending": "Reprendre l'envoi",
+        "Paused: no new batch is sent until you resume.": "En pause : aucun nouveau lot n'est envoyé avant la reprise.",
+        "{count} recipient(s) already received this campaign in an earlier, interrupted send and are skipped.": "{count} destinataire(s) ont déjà reçu cette campagne lors d'un envoi interrompu et sont ignorés.",
+        "Template cache: {hit_rate}% hit rate, {saved}s of generation time saved.": "Cache des modèles : {hit_rate}% de réussite, {saved}s de génération économisées.",
+        "This shows how the email will appear for the selected contact. Use the arrows to browse your contacts. To make changes, use the *Editable Email Content* section on the left.": "Ceci montre l'apparence de l'e-mail pour le contact sélectionné. Utilisez les flèches pour parcourir vos contacts. Pour apporter des modifications, utilisez la section 'Contenu de l'e-mail modifiable' sur la gauche."
     }
 }
 
 # Default language if no session state is set
 DEFAULT_LANG = "en"
 
-# Global variable to store the selected language
-_selected_lang = DEFAULT_LANG
+# Language of the current session. Streamlit runs each session's script in its own thread,
+# and a context variable set there is only seen by that session, unlike a module global.
+_selected_lang = contextvars.ContextVar("selected_lang", default=DEFAULT_LANG)
+
+# Catalogs compiled once: {language_code: {key: (translation, has_placeholders)}}
+_CATALOGS = {
+    lang_code: {key: (text, "{" in text) for key, text in catalog.items()}
+    for lang_code, catalog in TRANSLATIONS.items()
+}
+_EMPTY_CATALOG = {}
 
 def set_language(lang_code):
-    """Sets the global language for translations."""
-    global _selected_lang
-    if lang_code in LANGUAGES:
-        _selected_lang = lang_code
-    else:
-        _selected_lang = DEFAULT_LANG # Fallback to default if invalid code
+    """Sets the language of translations for the current session (thread / context)."""
+    _selected_lang.set(lang_code if lang_code in LANGUAGES else DEFAULT_LANG) # Fallback to default if invalid code
 
-def _t(key, **kwargs):
-    """
-    Translates a given key into the selected language and formats it with kwargs.
-    If the key is not found, it returns the key itself as a fallback.
-    """
-    translation = TRANSLATIONS.get(_selected_lang, {}).get(key, key)
+def get_language():
+    """Returns the language of translations for the current session."""
+    return _selected_lang.get()
+
+def _fill(key, lang_code, entry, kwargs):
+    translation, has_placeholders = entry
+    if not kwargs or not has_placeholders:
+        return translation # Nothing to fill in: no str.format call
     try:
         # Attempt to format the string with provided keyword arguments
         return translation.format(**kwargs)
     except KeyError as e:
         # Log or handle cases where a placeholder is missing in the translation string
         # For now, we'll just return the unformatted translation with a warning.
-        print(f"Translation Error: Missing placeholder {e} for key '{key}' in language '{_selected_lang}'. Original translation: '{translation}'")
+        print(f"Translation Error: Missing placeholder {e} for key '{key}' in language '{lang_code}'. Original translation: '{translation}'")
         return translation # Return unformatted string if formatting fails
     except IndexError as e:
-        print(f"Translation Error: Index error {e} for key '{key}' in language '{_selected_lang}'. Original translation: '{translation}'")
-        return translation # Return unformatted string if formatting fails
\ No newline at end of file
+        print(f"Translation Error: Index error {e} for key '{key}' in language '{lang_code}'. Original translation: '{translation}'")
+        return translation # Return unformatted string if formatting fails
+
+def translate(key, lang_code, **kwargs):
+    """
+    Translates a given key into an explicit language and formats it with kwargs.
+    If the key is not found, it returns the key itself as a fallback.
+    """
+    entry = _CATALOGS.get(lang_code, _EMPTY_CATALOG).get(key) or (key, "{" in key)
+    return _fill(key, lang_code, entry, kwargs)
+
+def _t(key, **kwargs):
+    """Translates a given key into the current session's language (see translate)."""
+    lang_code = _selected_lang.get()
+    entry = _CATALOGS.get(lang_code, _EMPTY_CATALOG).get(key)
+    if entry is None:
+        entry = (key, "{" in key)
+    elif not kwargs:
+        return entry[0] # Most calls: a plain catalog lookup
+    return _fill(key, lang_code, entry, kwargs)